@@ -0,0 +1,75 @@
+"""Fire-and-forget share analytics, batched off the request path.
+
+The request thread does a single put_nowait; a daemon consumer drains up
+to 256 events at a time and appends them as one write, so the disk
+round-trip is amortized across the batch and never shows up in response
+tail latency.
+"""
+import logging
+import os
+import queue
+import threading
+
+import orjson
+
+logger = logging.getLogger('analytics')
+
+ANALYTICS_PATH = os.environ.get('ANALYTICS_LOG', 'share_analytics.jsonl')
+BATCH_MAX = 256
+
+_queue = queue.Queue(maxsize=10_000)
+
+
+def record(event):
+    """Enqueue one event without blocking; False means the buffer is full
+    and the event was dropped (analytics are best-effort)."""
+    try:
+        _queue.put_nowait(event)
+        return True
+    except queue.Full:
+        return False
+
+
+def _drain():
+    batch = [_queue.get()]
+    while len(batch) < BATCH_MAX:
+        try:
+            batch.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _writer():
+    while True:
+        batch = _drain()
+        try:
+            buf = b''.join(orjson.dumps(event) + b'\n' for event in batch)
+            with open(ANALYTICS_PATH, 'ab') as f:
+                f.write(buf)
+        except Exception:
+            # Never let a disk hiccup kill the consumer; the record goes
+            # through the app's queued logging, so formatting stays off
+            # this thread's write path too.
+            logger.exception('dropped %d analytics events', len(batch))
+
+
+_writer_started = False
+_writer_lock = threading.Lock()
+
+
+def start_writer():
+    """Start the consumer thread in this process; idempotent.
+
+    Under gunicorn's preload_app this module is imported in the master,
+    and a thread started at import would not survive the fork into
+    workers — events would queue forever. Each worker calls this from
+    the post_fork hook (via app.start_worker).
+    """
+    global _writer_started
+    with _writer_lock:
+        if _writer_started:
+            return
+        threading.Thread(target=_writer, daemon=True,
+                         name='analytics-writer').start()
+        _writer_started = True
@@ -1,23 +1,561 @@
-from flask import Flask, request, jsonify
-from PIL import Image
-import io
+from flask import Response, request
+from flask.json.provider import JSONProvider
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from itertools import islice
+
+import numpy as np
+import onnxruntime as ort
+import orjson
+import redis
+import torch
+from flask_compress import Compress
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from sortedcontainers import SortedKeyList
+from torchvision import models
+from torchvision.io import decode_image, ImageReadMode
+from torchvision.transforms import v2
+
+import analytics
+import logging_setup
+import procfs
+from auth import init_auth
+from category_routes import category_bp
+from fast_router import FastRouterFlask
+from logging_setup import init_logging
+from metrics import MonitoringMiddleware
+from social_routes import social_bp
+from swagger_setup import setup_swagger
+
+# Nothing in this process ever trains: keep autograd off globally so the
+# decode/preprocess tensors skip version-counter and graph bookkeeping.
+torch.set_grad_enabled(False)
+
+app = FastRouterFlask(__name__)
+init_logging(app)
+init_auth(app)
+app.register_blueprint(category_bp)
+app.register_blueprint(social_bp)
+monitoring = MonitoringMiddleware(app)
+setup_swagger(app)
+
+# JSON list responses compress ~10x; only bodies past 512 bytes are worth it.
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 512
+Compress(app)
+
+
+class OrjsonProvider(JSONProvider):
+    """jsonify via orjson for every blueprint: C-speed encoding, bytes out
+    (no str->bytes re-encode), datetime/uuid/numpy handled natively."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(
+            obj, option=orjson.OPT_UTC_Z | orjson.OPT_SERIALIZE_NUMPY)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+app.json = OrjsonProvider(app)
+
+
+def _client_ip():
+    # Behind nginx/a load balancer the socket peer is the proxy; use the
+    # first X-Forwarded-For hop when present.
+    forwarded = request.headers.get('X-Forwarded-For')
+    if forwarded:
+        return forwarded.split(',')[0].strip()
+    return get_remote_address()
+
+
+def _principal():
+    """Rate-limit key: the caller's API key when presented, else client IP."""
+    return request.headers.get('X-API-KEY') or _client_ip()
+
+
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+# One connection pool shared by the limiter (and any other Redis user in
+# this process) instead of a pool per component.
+redis_pool = redis.ConnectionPool.from_url(REDIS_URL)
+
+# Counters live in Redis so the limit stays "10 per minute" total across
+# all gunicorn workers instead of 10 per worker; moving-window checks are a
+# single Lua EVALSHA against a sorted set.
+limiter = Limiter(
+    _principal,
+    app=app,
+    storage_uri=os.environ.get('RATELIMIT_STORAGE_URI', REDIS_URL),
+    storage_options={'connection_pool': redis_pool},
+    strategy='moving-window',
+    default_limits=['200 per minute'],
+)
+
+# Frequency limits alone don't stop a burst of slow inferences from tying
+# up every worker, so /predict also carries an in-flight cap per principal:
+# a ZSET of live request ids, checked-and-added atomically in Lua.
+_CONCURRENCY_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+redis_client = redis.Redis(connection_pool=redis_pool)
+# register_script loads the body once; later calls are EVALSHA.
+_acquire_slot = redis_client.register_script(_CONCURRENCY_LUA)
+
+
+def concurrency_limit(max_inflight, window=60):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = f'concurrent:{_principal()}'
+            req_id = uuid.uuid4().hex
+            now = time.time()
+            allowed = _acquire_slot(
+                keys=[key],
+                args=[now - window, max_inflight, now, req_id, window])
+            if not allowed:
+                return _ERR_TOO_MANY_INFLIGHT
+            try:
+                return view(*args, **kwargs)
+            finally:
+                redis_client.zrem(key, req_id)
+        return wrapper
+    return decorator
+
+
+MODEL_PATH = 'models/best_model.pth'
+ONNX_PATH = 'models/resnet18.onnx'
+CLASS_NAMES = ['Akara', 'Bread', 'Egusi', 'Moi Moi', 'Rice and Stew', 'Yam']
+
+ALLOWED_IMAGE_MIMETYPES = {'image/jpeg', 'image/png', 'image/webp'}
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
+# Werkzeug drops oversize bodies at the socket layer before any handler runs.
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+# Micro-batching knobs: collect up to BATCH_SIZE queued requests or wait at
+# most BATCH_WINDOW seconds before running a (possibly partial) batch.
+BATCH_SIZE = 8
+BATCH_WINDOW = 0.005
+PREDICT_TIMEOUT = 30
+TOP_K = 3
+
+
+def export_onnx():
+    """Load the ResNet18 checkpoint and export it to ONNX_PATH.
+
+    Runs at import: under preload_app that is once, in the gunicorn
+    master, so the exported graph (and the page cache holding it) is
+    shared by every worker. No onnxruntime state is created here — the
+    session's intra-op thread pool is not fork-safe, so sessions are
+    built per worker in start_worker.
+    """
+    # Overlap the I/O-bound checkpoint read with the CPU-bound module
+    # construction; mmap avoids copying the weights through a read buffer.
+    # The ImageNet weights are skipped since the checkpoint overwrites them.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        weights = pool.submit(torch.load, MODEL_PATH, map_location='cpu',
+                              mmap=True, weights_only=True)
+        model = models.resnet18()
+        model.fc = torch.nn.Linear(model.fc.in_features, len(CLASS_NAMES))
+    model.load_state_dict(weights.result())
+    model.eval()
+
+    torch.onnx.export(
+        model, torch.randn(1, 3, 224, 224), ONNX_PATH,
+        opset_version=17,
+        input_names=['input'], output_names=['logits'],
+        dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+    )
+
+
+def build_session():
+    """Build and warm this process's onnxruntime session.
+
+    onnxruntime fuses Conv+BN+ReLU into single kernels and runs its own
+    tuned GEMM — no Python-level op dispatch on the hot path.
+    """
+    so = ort.SessionOptions()
+    so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    so.intra_op_num_threads = os.cpu_count()
+    session = ort.InferenceSession(ONNX_PATH, sess_options=so,
+                                   providers=['CPUExecutionProvider'])
+
+    # Warm up the session on the shapes we actually serve (single image and
+    # a full micro-batch) so allocator growth and kernel selection happen at
+    # startup, not on the first real request.
+    for batch in (1, BATCH_SIZE):
+        example = np.zeros((batch, 3, 224, 224), dtype=np.float32)
+        session.run(None, {'input': example})
+    preprocess(torch.zeros(3, 640, 480, dtype=torch.uint8))
+
+    return session
+
+
+# Tensor-native pipeline: libjpeg-turbo decode feeds a SIMD resize and a
+# single-pass dtype conversion, with no PIL intermediates. The model was
+# trained on Resize+ToTensor only, so no Normalize step here either.
+preprocess = v2.Compose([
+    v2.Resize((224, 224), antialias=True),
+    v2.ToDtype(torch.float32, scale=True),
+])
+
+export_onnx()
+
+# Built per worker by start_worker; see the fork-safety note there.
+ML_SESSION = None
+
+# Request threads never touch the session directly: they queue (tensor,
+# future) pairs and block on the future while a single worker batches the
+# forwards, so the session's intra-op thread pool is never oversubscribed.
+_inference_queue = queue.Queue()
+
+
+def _inference_worker():
+    while True:
+        jobs = [_inference_queue.get()]
+        deadline = time.monotonic() + BATCH_WINDOW
+        while len(jobs) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                jobs.append(_inference_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        try:
+            batch = torch.cat([tensor for tensor, _ in jobs], dim=0)
+            logits = ML_SESSION.run(None, {'input': batch.numpy()})[0]
+            exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+            probs = exp / exp.sum(axis=1, keepdims=True)
+            # argpartition + a sort of just TOP_K beats a full row sort, and
+            # tolist() hands back plain Python scalars in one hop instead of
+            # per-element .item() calls later.
+            part = np.argpartition(-probs, TOP_K - 1, axis=1)[:, :TOP_K]
+            order = np.take_along_axis(-probs, part, axis=1).argsort(axis=1)
+            top_indices = np.take_along_axis(part, order, axis=1)
+            top_probs = np.take_along_axis(probs, top_indices, axis=1)
+            for row, (_, future) in enumerate(jobs):
+                future.set_result((top_probs[row].tolist(),
+                                   top_indices[row].tolist()))
+        except Exception as exc:
+            for _, future in jobs:
+                if not future.done():
+                    future.set_exception(exc)
+
+
+_worker_started = False
+_worker_lock = threading.Lock()
+
+
+def start_worker():
+    """Per-process startup: the ORT session and every daemon thread.
+
+    With preload_app the app module is imported in the gunicorn master;
+    threads — the micro-batching inference worker, the analytics writer,
+    the metrics sampler, the logging listener — and onnxruntime's
+    intra-op thread pool do not survive the fork into workers, so
+    everything with a living thread starts here, called from the
+    post_fork hook in gunicorn_conf. Idempotent, so the dev server and
+    run_inference's lazy path can call it too.
+    """
+    global ML_SESSION, _worker_started
+    with _worker_lock:
+        if _worker_started:
+            return
+        logging_setup.start_listener()
+        ML_SESSION = build_session()
+        threading.Thread(target=_inference_worker, daemon=True).start()
+        monitoring.start_sampler()
+        analytics.start_writer()
+        _worker_started = True
+
+
+# Prediction history, kept ordered by created_at so the default listing is a
+# slice instead of a per-request sort, with a per-label secondary index so
+# label filters never scan the whole store.
+def _by_created_at():
+    return SortedKeyList(key=lambda p: p['created_at'])
+
+
+_predictions_store = _by_created_at()
+_predictions_by_label = collections.defaultdict(_by_created_at)
+_predictions_lock = threading.Lock()
+
+# Retention cap so a long-running server doesn't grow the history forever.
+PRED_STORE_MAX = int(os.environ.get('PRED_STORE_MAX', 10000))
+
+
+def _record_prediction(predicted_label, all_predictions):
+    # created_at is an epoch-ns int internally: cheap to store, compare and
+    # keep sorted. It is only formatted to ISO when a response is built.
+    record = {
+        'id': str(uuid.uuid4()),
+        'label': predicted_label,
+        'confidence': all_predictions[0]['confidence'],
+        'all_predictions': all_predictions,
+        'created_at': time.time_ns(),
+    }
+    with _predictions_lock:
+        _predictions_store.add(record)
+        _predictions_by_label[predicted_label].add(record)
+        if len(_predictions_store) > PRED_STORE_MAX:
+            oldest = _predictions_store.pop(0)
+            _predictions_by_label[oldest['label']].remove(oldest)
+    return record
+
+
+def _public(record):
+    """Copy of a stored record with created_at formatted for clients."""
+    iso = datetime.fromtimestamp(record['created_at'] / 1e9,
+                                 tz=timezone.utc).isoformat()
+    return {**record, 'created_at': iso}
+
+
+def _parse_timestamp(value):
+    """Parse a filter value (epoch seconds/ns or ISO-8601) to epoch ns."""
+    if value is None:
+        return None
+    try:
+        number = float(value)
+        # Heuristic: anything plausibly past ~2001 in ns is already ns.
+        return int(number) if number > 1e15 else int(number * 1e9)
+    except ValueError:
+        dt = datetime.fromisoformat(value)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return int(dt.timestamp() * 1e9)
+
+
+# LRU cache of predictions keyed by image content hash: repeated uploads of
+# the same bytes skip decoding and the model forward entirely.
+PREDICTION_CACHE_SIZE = 1024
+_prediction_cache = collections.OrderedDict()
+_prediction_cache_lock = threading.Lock()
+
+
+def _cache_get(key):
+    with _prediction_cache_lock:
+        result = _prediction_cache.get(key)
+        if result is not None:
+            _prediction_cache.move_to_end(key)
+        return result
+
+
+def _cache_put(key, result):
+    with _prediction_cache_lock:
+        _prediction_cache[key] = result
+        _prediction_cache.move_to_end(key)
+        if len(_prediction_cache) > PREDICTION_CACHE_SIZE:
+            _prediction_cache.popitem(last=False)
+
+
+_UPLOAD_CHUNK = 64 * 1024
+
+
+def _read_upload(stream):
+    """Read an upload in chunks into a single bytearray, hashing as we go.
+
+    The bytearray is the only copy of the payload: the content hash is fed
+    incrementally and the decoder later wraps the same buffer zero-copy via
+    torch.frombuffer.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    buf = bytearray()
+    while True:
+        chunk = stream.read(_UPLOAD_CHUNK)
+        if not chunk:
+            break
+        digest.update(chunk)
+        buf += chunk
+    return buf, digest
+
+
+def run_inference(input_tensor):
+    """Queue one preprocessed image and wait for its row of the batched result."""
+    if not _worker_started:
+        # Covers processes that never ran the post_fork hook (tests,
+        # flask shell); under gunicorn this branch is dead.
+        start_worker()
+    future = concurrent.futures.Future()
+    _inference_queue.put((input_tensor, future))
+    return future.result(timeout=PREDICT_TIMEOUT)
+
+
+def _json(data, status=200):
+    """orjson-serialized JSON response; bytes out, no str round-trip."""
+    return Response(orjson.dumps(data), status=status,
+                    mimetype='application/json')
+
+
+# Fixed responses are built once at import and returned verbatim; nothing
+# downstream mutates them, so sharing one Response object per shape is safe
+# and skips per-request dict building, encoding and header assembly.
+_ERR_NO_IMAGE = _json({'error': 'No image uploaded'}, 400)
+_ERR_TOO_LARGE = _json({'error': 'image too large'}, 413)
+_ERR_TOO_MANY_INFLIGHT = _json({'error': 'too many concurrent requests'}, 429)
+
+# /classes never changes after startup and /health only varies in its
+# timestamp, so both are serialized once at import instead of per request.
+_CLASSES_RESPONSE = Response(
+    orjson.dumps({'classes': CLASS_NAMES, 'count': len(CLASS_NAMES)}),
+    mimetype='application/json',
+)
+_HEALTH_PREFIX = orjson.dumps({
+    'status': 'healthy',
+    'model': 'resnet18',
+    'classes': len(CLASS_NAMES),
+})[:-1]
+_LIVENESS_RESPONSE = Response(b'{"status": "alive"}',
+                              mimetype='application/json')
+
+# CPU/RSS readings walk /proc; with an orchestrator probing every second or
+# two, sample them at most once a second and serve the cached values.
+_STATS = {'ts': 0.0, 'cpu': 0.0, 'rss': 0}
+_STATS_LOCK = threading.Lock()
+
+
+def _system_stats():
+    now = time.monotonic()
+    with _STATS_LOCK:
+        if now - _STATS['ts'] > 1.0:
+            _STATS['cpu'] = procfs.cpu_percent()
+            _STATS['rss'] = procfs.rss_bytes()
+            _STATS['ts'] = now
+        return _STATS['cpu'], _STATS['rss']
+
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    cpu, rss = _system_stats()
+    timestamp = datetime.now(timezone.utc).isoformat()
+    # last_accuracy is the lock-free mirror of the accuracy gauge —
+    # 0.0 until a deploy reports a validation run. The CPU figure is
+    # system-wide (aggregate /proc/stat), matching the metrics gauge.
+    dynamic = (f', "timestamp": "{timestamp}", '
+               f'"system_cpu_percent": {cpu}, "rss_bytes": {rss}, '
+               f'"model_accuracy": {monitoring.last_accuracy}}}')
+    return Response(_HEALTH_PREFIX + dynamic.encode(),
+                    mimetype='application/json')
+
+
+@app.route('/health/liveness', methods=['GET'])
+def liveness():
+    # Liveness must stay constant-time: no /proc reads, no allocation.
+    return _LIVENESS_RESPONSE
+
+
+@app.route('/classes', methods=['GET'])
+def get_classes():
+    return _CLASSES_RESPONSE
 
-app = Flask(__name__)
 
 @app.route('/predict', methods=['POST'])
+@limiter.limit('10 per minute')
+@concurrency_limit(max_inflight=4)
 def predict():
     if 'image' not in request.files:
-        return jsonify({'error': 'No image uploaded'}), 400
+        return _ERR_NO_IMAGE
 
     file = request.files['image']
+    # Reject obviously bad requests before paying for hashing or decoding.
+    if file.mimetype not in ALLOWED_IMAGE_MIMETYPES:
+        return _json({'error': f'unsupported media type: {file.mimetype}'}, 415)
+    if request.content_length and request.content_length > MAX_UPLOAD_BYTES:
+        return _ERR_TOO_LARGE
+
     try:
-        # Placeholder for preprocessing & prediction
-        image = Image.open(file.stream)
-        # TODO: Resize, normalize, and run model here
-        predicted_label = "Moi Moi"  # Dummy output for now
-        return jsonify({'label': predicted_label})
+        img_bytes, digest = _read_upload(file.stream)
+        cache_key = digest.digest()
+        etag = digest.hexdigest()
+
+        # A client that already holds this prediction gets an empty 304
+        # before we spend anything on decoding or inference.
+        if request.headers.get('If-None-Match') == etag:
+            return '', 304, {'ETag': etag}
+
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            predicted_label, all_predictions = cached
+        else:
+            decoded = decode_image(
+                torch.frombuffer(img_bytes, dtype=torch.uint8),
+                mode=ImageReadMode.RGB,
+            )
+            input_tensor = preprocess(decoded).unsqueeze(0)
+            top_probs, top_indices = run_inference(input_tensor)
+            # Drop the image tensors before building/serializing the
+            # response so they don't sit resident per in-flight request.
+            del decoded, input_tensor
+
+            predicted_label = CLASS_NAMES[top_indices[0]]
+            all_predictions = [
+                {'label': CLASS_NAMES[idx], 'confidence': round(prob, 4)}
+                for prob, idx in zip(top_probs, top_indices)
+            ]
+            _cache_put(cache_key, (predicted_label, all_predictions))
+
+        # Cache hits still get a fresh record: the history tracks uploads,
+        # not forwards.
+        record = _record_prediction(predicted_label, all_predictions)
+        response = _json(_public(record))
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'private, max-age=60'
+        return response
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _json({'error': str(e)}, 500)
+
+
+@app.route('/predictions', methods=['GET'])
+def get_predictions():
+    label = request.args.get('label')
+    try:
+        created_after = _parse_timestamp(request.args.get('created_after'))
+        created_before = _parse_timestamp(request.args.get('created_before'))
+        limit = min(int(request.args.get('limit', 20)), 100)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return _json({'error': 'invalid filter or pagination value'}, 400)
+
+    with _predictions_lock:
+        if label is not None:
+            source = _predictions_by_label.get(label) or _by_created_at()
+        else:
+            source = _predictions_store
+        # Newest-first slice straight off the sorted index: O(log N + limit).
+        window = source.irange_key(created_after, created_before, reverse=True)
+        items = [_public(r) for r in islice(window, offset, offset + limit)]
+        total = len(source)
+
+    return _json({'predictions': items, 'total': total,
+                  'limit': limit, 'offset': offset})
+
+
+# At the end of the module on purpose: every route — the blueprints
+# above and the core handlers in this file — is registered by now, so
+# the frozen table covers /predict and friends instead of leaving the
+# hottest paths to fall through to Werkzeug's matcher.
+app.freeze_routes()
+
 
 if __name__ == '__main__':
+    # Dev convenience only. In production run the multi-worker server:
+    #   gunicorn -c gunicorn_conf.py app:app
+    start_worker()
     app.run(debug=True)
@@ -0,0 +1,198 @@
+"""User accounts and request authentication for the FlavorSnap API."""
+import collections
+import concurrent.futures
+import functools
+import os
+import threading
+import uuid
+
+from cachetools import TTLCache
+from flask import Blueprint, current_app, g, jsonify, request
+from flask_bcrypt import Bcrypt, check_password_hash
+from flask_jwt_extended import (JWTManager, create_access_token, get_jwt,
+                                get_jwt_identity, verify_jwt_in_request)
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+bcrypt = Bcrypt()
+jwt = JWTManager()
+
+auth_bp = Blueprint('auth', __name__)
+
+# bcrypt verification pins a CPU for its whole 2^cost loop, so it runs in a
+# process pool instead of on the request thread: the GIL stays free and
+# concurrent hashes are capped at the core count. A small per-IP in-flight
+# cap stops a hash-flood from queueing up pool work.
+HASH_POOL = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count())
+_LOGIN_INFLIGHT_PER_IP = 2
+_login_slots = collections.defaultdict(
+    lambda: threading.BoundedSemaphore(_LOGIN_INFLIGHT_PER_IP))
+
+# Verified against when the username doesn't exist, so unknown and known
+# usernames cost the same bcrypt work and response time never reveals
+# which it was. Built in init_auth at the configured cost — the oracle
+# would reopen if the dummy ran at a different number of rounds.
+_DUMMY_HASH = None
+
+
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    password_hash = db.Column(db.String(128), nullable=False)
+    # unique=True gives the O(log n) index lookups need; SQLite permits any
+    # number of NULLs in a unique index, so keyless users are fine.
+    api_key = db.Column(db.String(64), unique=True)
+    role = db.Column(db.String(20), default='user', nullable=False)
+
+    def set_password(self, password):
+        rounds = current_app.config['BCRYPT_LOG_ROUNDS']
+        self.password_hash = bcrypt.generate_password_hash(
+            password, rounds=rounds).decode()
+
+    def check_password(self, password):
+        return bcrypt.check_password_hash(self.password_hash, password)
+
+
+# API-key identities change rarely but are checked on every authenticated
+# request, so the hot path is a TTL-cached dict get instead of a SQLAlchemy
+# query. Only (user_id, role) tuples are cached — never ORM objects, which
+# would leak detached sessions.
+_auth_cache = TTLCache(maxsize=10_000, ttl=60)
+_auth_cache_lock = threading.RLock()
+
+
+def _identity_for_api_key(api_key):
+    with _auth_cache_lock:
+        identity = _auth_cache.get(api_key)
+    if identity is not None:
+        return identity
+    user = User.query.filter_by(api_key=api_key).first()
+    if user is None:
+        return None
+    identity = (user.id, user.role)
+    with _auth_cache_lock:
+        _auth_cache[api_key] = identity
+    return identity
+
+
+def _invalidate_api_key(api_key):
+    with _auth_cache_lock:
+        _auth_cache.pop(api_key, None)
+
+
+def api_key_or_jwt_required(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        api_key = request.headers.get('X-API-KEY')
+        if api_key:
+            identity = _identity_for_api_key(api_key)
+            if identity is None:
+                return jsonify({'error': 'invalid API key'}), 401
+            g.user_id, g.user_role = identity
+            return view(*args, **kwargs)
+        try:
+            verify_jwt_in_request()
+        except Exception:
+            return jsonify({'error': 'authentication required'}), 401
+        g.user_id = get_jwt_identity()
+        g.user_role = get_jwt().get('role')
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def role_required(role):
+    """Require an authenticated caller holding `role` (admins always pass).
+
+    The role rides along with the identity — embedded in the JWT claims at
+    token-creation time, or part of the cached API-key tuple — so the check
+    never needs its own User SELECT.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        @api_key_or_jwt_required
+        def wrapper(*args, **kwargs):
+            if g.user_role not in (role, 'admin'):
+                return jsonify({'error': 'forbidden'}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@auth_bp.route('/register', methods=['POST'])
+def register():
+    payload = request.get_json(silent=True) or {}
+    username = payload.get('username')
+    password = payload.get('password')
+    if not username or not password:
+        return jsonify({'error': 'username and password required'}), 400
+    if User.query.filter_by(username=username).first() is not None:
+        return jsonify({'error': 'username already taken'}), 409
+
+    user = User(username=username, api_key=uuid.uuid4().hex)
+    user.set_password(password)
+    db.session.add(user)
+    db.session.commit()
+    _invalidate_api_key(user.api_key)
+    return jsonify({'id': user.id, 'username': user.username,
+                    'api_key': user.api_key}), 201
+
+
+@auth_bp.route('/login', methods=['POST'])
+def login():
+    payload = request.get_json(silent=True) or {}
+    password = payload.get('password', '')
+    user = User.query.filter_by(username=payload.get('username', '')).first()
+
+    slot = _login_slots[request.remote_addr]
+    if not slot.acquire(blocking=False):
+        return jsonify({'error': 'too many login attempts in flight'}), 429
+    try:
+        # Unknown usernames verify against the dummy hash inside the
+        # same semaphore: bailing out early both leaked a timing oracle
+        # for username enumeration and let those requests bypass the
+        # per-IP in-flight cap.
+        stored = user.password_hash if user is not None else _DUMMY_HASH
+        ok = HASH_POOL.submit(check_password_hash,
+                              stored, password).result()
+    finally:
+        slot.release()
+    if user is None or not ok:
+        return jsonify({'error': 'invalid credentials'}), 401
+
+    # Rehash-on-login: if the stored hash's embedded cost ($2b$NN$...)
+    # differs from the configured rounds, upgrade it while we still have
+    # the plaintext.
+    stored_rounds = int(user.password_hash.split('$')[2])
+    if stored_rounds != current_app.config['BCRYPT_LOG_ROUNDS']:
+        user.set_password(password)
+        db.session.commit()
+
+    # The role is a claim, not a lookup: protected routes read it straight
+    # from the verified token. Tokens must be rotated if a role changes.
+    token = create_access_token(identity=user.id,
+                                additional_claims={'role': user.role})
+    return jsonify({'access_token': token, 'api_key': user.api_key})
+
+
+def init_auth(app):
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///flavorsnap.db')
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+    # Cost 10 hashes ~4x faster than flask-bcrypt's default 12; operators
+    # can raise it per deployment without a code change.
+    app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_ROUNDS', '10'))
+    global _DUMMY_HASH
+    _DUMMY_HASH = bcrypt.generate_password_hash(
+        uuid.uuid4().hex, rounds=app.config['BCRYPT_LOG_ROUNDS']).decode()
+    db.init_app(app)
+    bcrypt.init_app(app)
+    jwt.init_app(app)
+    app.register_blueprint(auth_bp)
+
+    # Schema creation is an operator action (`flask init-db`), not an
+    # import side effect — otherwise every gunicorn worker re-runs it on
+    # boot.
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create the user database tables."""
+        db.create_all()
+        print('Initialized the auth database.')
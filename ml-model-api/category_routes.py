@@ -0,0 +1,183 @@
+"""HTTP routes for community category submission, voting and moderation."""
+import functools
+import io
+import itertools
+import os
+import re
+import secrets
+import time
+
+import numpy as np
+from flask import Blueprint, g, jsonify, request
+from werkzeug.utils import secure_filename
+
+from auth import api_key_or_jwt_required, role_required
+from category_manager import CategoryManager
+from uring_engine import save_buffers
+from validation import typed_route
+
+category_bp = Blueprint('categories', __name__, url_prefix='/categories')
+
+UPLOAD_DIR = os.environ.get('CATEGORY_UPLOAD_DIR', 'uploads/categories')
+manager = CategoryManager()
+
+# uuid4 costs a getrandom syscall per call; a ULID-style id — millisecond
+# timestamp plus a process-local counter seeded from urandom once — is
+# pure arithmetic after startup and still sorts by upload time.
+_ulid_counter = itertools.count(secrets.randbits(80))
+_ULID_MASK = (1 << 80) - 1
+
+
+def _fast_id():
+    return (f'{int(time.time() * 1000):012x}'
+            f'{next(_ulid_counter) & _ULID_MASK:020x}')
+
+
+# Must start alphanumeric so '.', '..' and dotfiles never take the
+# fast path.
+_SAFE_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]{0,254}$')
+
+
+@functools.lru_cache(maxsize=4096)
+def _safe(filename):
+    """secure_filename with a fast path for benign ASCII names.
+
+    Most uploads arrive with plain camera/phone names; for those one regex
+    match replaces secure_filename's unicodedata pipeline, and repeats of
+    the same name are answered from the cache.
+    """
+    if filename.isascii() and _SAFE_RE.match(filename):
+        return filename
+    return secure_filename(filename)
+
+
+def _spooled_fd(stream):
+    """Real file descriptor for an upload that already spooled to disk.
+
+    Returns None while the part still lives in memory — calling fileno()
+    on an unrolled SpooledTemporaryFile would force it onto disk, which
+    is exactly the copy we are trying to avoid.
+    """
+    if not getattr(stream, '_rolled', True):
+        return None
+    try:
+        return stream.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+def _sendfile_to(path, src_fd):
+    """In-kernel copy of the whole source file to path: zero userspace
+    copies versus read-into-Python-then-write."""
+    size = os.fstat(src_fd).st_size
+    dst = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        offset = 0
+        while offset < size:
+            offset += os.sendfile(dst, src_fd, offset, size - offset)
+    finally:
+        os.close(dst)
+
+
+@category_bp.route('', methods=['POST'])
+@api_key_or_jwt_required
+def submit_category():
+    name = request.form.get('name')
+    if not name:
+        return jsonify({'error': 'category name required'}), 400
+    description = request.form.get('description', '')
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    filenames = []
+    items = []
+    for file in request.files.getlist('images'):
+        filename = f'{_fast_id()}_{_safe(file.filename)}'
+        path = os.path.join(UPLOAD_DIR, filename)
+        src_fd = _spooled_fd(file.stream)
+        if src_fd is not None:
+            # Large uploads already sit in a temp file; sendfile copies
+            # them file-to-file inside the kernel.
+            _sendfile_to(path, src_fd)
+        else:
+            # Small, still-in-memory parts are buffered once; all buffers
+            # go to disk as a single batched write instead of one blocking
+            # save per image.
+            items.append((path, bytearray(file.stream.read())))
+        filenames.append(filename)
+    save_buffers(items)
+
+    category_id = manager.submit_category(name, description, filenames,
+                                          str(g.user_id))
+    return jsonify({'id': category_id, 'images': filenames}), 201
+
+
+@category_bp.route('', methods=['GET'])
+def get_categories():
+    status = request.args.get('status')
+    try:
+        limit = min(int(request.args.get('limit', 50)), 200)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'invalid pagination value'}), 400
+    return jsonify({'categories': manager.get_categories(status, limit, offset)})
+
+
+@category_bp.route('/<category_id>', methods=['GET'])
+def get_category(category_id):
+    category = manager.get_category(category_id)
+    if category is None:
+        return jsonify({'error': 'category not found'}), 404
+    return jsonify(category)
+
+
+@category_bp.route('/popular', methods=['GET'])
+def get_popular_categories():
+    try:
+        limit = min(int(request.args.get('limit', 10)), 50)
+    except ValueError:
+        return jsonify({'error': 'invalid pagination value'}), 400
+    return jsonify({'categories': manager.get_popular_categories(limit)})
+
+
+@category_bp.route('/<category_id>/vote', methods=['POST'])
+@api_key_or_jwt_required
+@typed_route(vote=str)
+def vote_category(category_id, vote):
+    try:
+        ok = manager.vote_category(category_id, str(g.user_id), vote)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not ok:
+        return jsonify({'error': 'category not open for voting'}), 404
+    return jsonify({'status': 'recorded'})
+
+
+@category_bp.route('/<category_id>/moderate', methods=['POST'])
+@role_required('moderator')
+@typed_route(action=str, notes=(str, None))
+def moderate_category(category_id, action, notes):
+    try:
+        ok = manager.moderate_category(category_id, action, str(g.user_id),
+                                       notes)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not ok:
+        return jsonify({'error': 'category not pending'}), 404
+    return jsonify({'status': action})
+
+
+@category_bp.route('/stats', methods=['GET'])
+def get_category_stats():
+    # SoA path: status/vote columns arrive as one int64 matrix, so the
+    # whole aggregation is a bincount plus two column sums — no dicts.
+    cols = manager.get_stats_columns()
+    pending, approved, rejected, other = np.bincount(cols[:, 0], minlength=4)
+    return jsonify({
+        'total': int(cols.shape[0]),
+        'pending': int(pending),
+        'approved': int(approved),
+        'rejected': int(rejected),
+        'in_training': int(other),
+        'votes_up': int(cols[:, 1].sum()),
+        'votes_down': int(cols[:, 2].sum()),
+    })
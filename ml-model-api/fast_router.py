@@ -0,0 +1,54 @@
+"""O(1) dispatch for static routes, ahead of Werkzeug's rule matcher.
+
+Almost every route in this service is a fixed path (/health, /predict,
+/categories/popular, ...). Werkzeug still runs its per-request matcher
+over the whole Map for those; here they are frozen into one dict keyed by
+(method, path) at startup, so matching a static route is a single hash
+lookup. Parameterized rules and redirects fall through to Werkzeug
+unchanged.
+"""
+from flask import Flask
+
+
+class _StaticMatchAdapter:
+    """Wraps a bound MapAdapter with a pre-resolved rule for this request."""
+
+    __slots__ = ('_adapter', '_rule')
+
+    def __init__(self, adapter, rule):
+        self._adapter = adapter
+        self._rule = rule
+
+    def match(self, *args, **kwargs):
+        if kwargs.get('return_rule'):
+            return self._rule, {}
+        return self._rule.endpoint, {}
+
+    def __getattr__(self, name):
+        return getattr(self._adapter, name)
+
+
+class FastRouterFlask(Flask):
+    """Flask with a frozen (method, path) -> Rule table for static routes."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._static_rules = {}
+
+    def freeze_routes(self):
+        """Build the static dispatch table; call once after registration."""
+        table = {}
+        for rule in self.url_map.iter_rules():
+            if rule.arguments or rule.build_only:
+                continue
+            for method in rule.methods:
+                table[(method, rule.rule)] = rule
+        self._static_rules = table
+
+    def create_url_adapter(self, request):
+        adapter = super().create_url_adapter(request)
+        if request is not None and adapter is not None:
+            rule = self._static_rules.get((request.method, request.path))
+            if rule is not None:
+                return _StaticMatchAdapter(adapter, rule)
+        return adapter
@@ -0,0 +1,27 @@
+"""Gunicorn config for the FlavorSnap API.
+
+Run with:  gunicorn -c gunicorn_conf.py app:app
+"""
+import os
+
+bind = '0.0.0.0:5000'
+workers = 2 * os.cpu_count() + 1
+threads = 4
+worker_class = 'gthread'
+keepalive = 30
+
+# Import the app once in the master: the checkpoint load and ONNX export
+# run a single time and workers share the result copy-on-write. Anything
+# with a living thread (the inference worker, analytics writer, metrics
+# sampler, log listener) or fork-unsafe state (the ORT session's intra-op
+# pool) starts per worker in post_fork below.
+preload_app = True
+
+# Let the kernel shard accepts across workers instead of thundering-herd
+# wakeups on a single listening socket.
+reuse_port = True
+
+
+def post_fork(server, worker):
+    from app import start_worker
+    start_worker()
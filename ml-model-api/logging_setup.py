@@ -0,0 +1,47 @@
+"""Non-blocking application logging via a queue.
+
+Formatting a log record — and especially a traceback, which reads source
+files off disk — is too expensive for a request thread. Handlers here are
+replaced with a QueueHandler whose emit is one put_nowait; a QueueListener
+thread does all formatting and I/O.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+
+_log_queue = queue.SimpleQueue()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def start_listener():
+    """Start the drain thread in this process; idempotent.
+
+    Threads don't survive gunicorn's fork under preload_app, so the
+    handler wiring happens at import (in the master) while each worker
+    starts its own listener from the post_fork hook.
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return
+        stream = logging.StreamHandler()
+        stream.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        _listener = logging.handlers.QueueListener(
+            _log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def init_logging(app):
+    queue_handler = logging.handlers.QueueHandler(_log_queue)
+    # Root gets the queue too, so module loggers (analytics, ...) inherit
+    # the non-blocking path without their own wiring.
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(logging.INFO)
+    app.logger.handlers = [queue_handler]
+    app.logger.setLevel(logging.INFO)
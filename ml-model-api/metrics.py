@@ -0,0 +1,166 @@
+"""Prometheus monitoring for the FlavorSnap API."""
+import threading
+import time
+
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry,
+                               Counter, Gauge, Histogram, generate_latest)
+
+import procfs
+
+
+class MonitoringMiddleware:
+    """Request metrics plus system gauges, exposed at /metrics.
+
+    The serialized scrape body is cached: generate_latest() re-renders the
+    whole registry, so it only runs when something was recorded since the
+    last render and the cached copy is older than a second. System stats
+    are sampled from /proc on a background thread, never on the request
+    path.
+    """
+
+    SYSTEM_SAMPLE_INTERVAL = 2.0
+    CACHE_TTL = 1.0
+
+    def __init__(self, app=None):
+        self.registry = CollectorRegistry()
+        self.request_count = Counter(
+            'flavorsnap_http_requests_total', 'HTTP requests served',
+            ['method', 'endpoint', 'status'], registry=self.registry)
+        # Children pre-resolved per (method, endpoint); see _bind_children.
+        self._children = {}
+        self.request_latency = Histogram(
+            'flavorsnap_http_request_duration_seconds', 'Request latency',
+            ['method', 'endpoint'], registry=self.registry)
+        # System-wide on purpose: procfs.cpu_percent() reads the
+        # aggregate cpu line of /proc/stat, not /proc/self/stat, and the
+        # name says so.
+        self.cpu_percent = Gauge(
+            'flavorsnap_system_cpu_percent', 'System-wide CPU percent',
+            registry=self.registry)
+        self.rss_bytes = Gauge(
+            'flavorsnap_process_rss_bytes', 'Process resident memory',
+            registry=self.registry)
+        self.model_accuracy = Gauge(
+            'flavorsnap_model_accuracy', 'Validation accuracy of the model',
+            registry=self.registry)
+
+        # Plain-float mirror of the accuracy gauge. Gauge._value is a
+        # private, potentially mmap-and-lock-backed cell under
+        # multiprocess mode; health checks read this instead, and the
+        # GIL makes the float store/load atomic without a lock.
+        self._last_accuracy = 0.0
+
+        self._cache_body = b''
+        self._cache_ts = 0.0
+        self._dirty = True
+        self._cache_lock = threading.Lock()
+        self._sampler_started = False
+
+        if app is not None:
+            self.init_app(app)
+
+    STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+
+    def init_app(self, app):
+        app.before_request(self._start_timer)
+        app.after_request(self._record_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics)
+        self._bind_children(app)
+
+    def start_sampler(self):
+        """Start the /proc sampling thread in this process; idempotent.
+
+        Not started from init_app: under preload_app that runs in the
+        gunicorn master and the thread would not survive the fork, so
+        each worker starts its own from the post_fork hook.
+        """
+        if self._sampler_started:
+            return
+        self._sampler_started = True
+        threading.Thread(target=self._sample_system_loop, daemon=True,
+                         name='metrics-sampler').start()
+
+    def _bind_children(self, app):
+        """Pre-resolve child metrics for every route registered so far.
+
+        .labels() is a locked dict lookup inside prometheus_client, so
+        children are resolved once and the request hook just calls
+        .inc()/.observe() on them. The status label is a class
+        (2xx/4xx/...) so counters can be bound ahead of time too.
+        Routes added after init_app (the core handlers register later in
+        app.py) are bound lazily on their first request.
+        """
+        for rule in app.url_map.iter_rules():
+            for method in rule.methods:
+                key = (method, rule.endpoint)
+                if key not in self._children:
+                    self._bind_child(key)
+
+    def _bind_child(self, key):
+        method, endpoint = key
+        histogram = self.request_latency.labels(method, endpoint)
+        counters = tuple(
+            self.request_count.labels(method, endpoint, cls)
+            for cls in self.STATUS_CLASSES)
+        entry = self._children[key] = (histogram, counters)
+        return entry
+
+    def update_model_accuracy(self, accuracy):
+        self.model_accuracy.set(accuracy)
+        self._last_accuracy = accuracy
+        self._dirty = True
+
+    @property
+    def last_accuracy(self):
+        """Lock-free read of the most recently reported accuracy."""
+        return self._last_accuracy
+
+    def _start_timer(self):
+        # monotonic_ns: vDSO read, integer result, immune to wall-clock
+        # steps that would otherwise yield negative durations.
+        g.monitoring_start = time.monotonic_ns()
+
+    def _record_request(self, response):
+        endpoint = request.endpoint or 'unknown'
+        if endpoint == 'metrics':
+            return response
+        entry = self._children.get((request.method, endpoint))
+        if entry is None and request.endpoint is not None:
+            # A real route the eager pass missed (registered after
+            # init_app): bind it now, once. Unrouted 404s keep
+            # request.endpoint None and stay on the slow path below.
+            with self._cache_lock:
+                entry = (self._children.get((request.method, endpoint))
+                         or self._bind_child((request.method, endpoint)))
+        status_idx = response.status_code // 100 - 1
+        if entry is not None and 0 <= status_idx < len(self.STATUS_CLASSES):
+            histogram, counters = entry
+            started = getattr(g, 'monitoring_start', None)
+            if started is not None:
+                histogram.observe((time.monotonic_ns() - started) * 1e-9)
+            counters[status_idx].inc()
+        else:
+            # Unrouted requests (404s on unknown paths) take the slow path.
+            self.request_count.labels(
+                request.method, endpoint,
+                f'{response.status_code // 100}xx').inc()
+        self._dirty = True
+        return response
+
+    def _sample_system_loop(self):
+        while True:
+            self.cpu_percent.set(procfs.cpu_percent())
+            self.rss_bytes.set(procfs.rss_bytes())
+            self._dirty = True
+            time.sleep(self.SYSTEM_SAMPLE_INTERVAL)
+
+    def metrics(self):
+        now = time.monotonic()
+        with self._cache_lock:
+            if self._dirty and now - self._cache_ts > self.CACHE_TTL:
+                self._cache_body = generate_latest(self.registry)
+                self._cache_ts = now
+                self._dirty = False
+            body = self._cache_body
+        return Response(body, mimetype=CONTENT_TYPE_LATEST)
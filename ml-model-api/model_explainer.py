@@ -0,0 +1,449 @@
+"""Post-hoc model explanations for the XAI endpoints.
+
+Grad-CAM heatmaps, integrated-gradients attributions, similarity lookups
+against a feature database, and the overlay/text helpers the routes wrap
+into responses.
+"""
+import base64
+import contextlib
+import functools
+import threading
+
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# Jet colormap as an RGB lookup table, built once at import. Fancy-indexing
+# it colors the heatmap in one pass and already in RGB order, replacing an
+# applyColorMap pass plus a full-frame BGR-to-RGB conversion per overlay.
+_JET_LUT = cv2.applyColorMap(
+    np.arange(256, dtype=np.uint8).reshape(-1, 1),
+    cv2.COLORMAP_JET).reshape(256, 3)[:, ::-1].copy()
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _blend_overlay(rgb, heat, lut, alpha, out):
+        # Quantize, colormap and blend in one parallel pass per pixel —
+        # the LUT-then-addWeighted fallback walks the frame three times.
+        height, width = heat.shape
+        for y in prange(height):
+            for x in range(width):
+                idx = min(255, int(heat[y, x] * 255))
+                for c in range(3):
+                    out[y, x, c] = np.uint8(alpha * lut[idx, c]
+                                            + (1 - alpha) * rgb[y, x, c])
+else:
+    _blend_overlay = None
+
+# Static per-class tooltip copy, built once at import instead of being
+# re-allocated inside every lookup.
+_CLASS_INFO = {
+    'jollof_rice': {
+        'features': 'tomato-stained grains, pepper flecks',
+        'learning': 'Color distribution and grain texture.',
+    },
+    'egusi_soup': {
+        'features': 'melon-seed granules, leafy greens',
+        'learning': 'Granular texture against green contrast.',
+    },
+    'suya': {
+        'features': 'skewered strips, yaji spice crust',
+        'learning': 'Skewer geometry and crust color.',
+    },
+    'pounded_yam': {
+        'features': 'smooth pale mound, glossy surface',
+        'learning': 'Uniform texture and specular highlights.',
+    },
+}
+
+_DEFAULT_CLASS_INFO = {
+    'features': 'dish-specific shapes and colors',
+    'learning': 'Texture, color and shape statistics.',
+}
+
+
+# Certainty buckets as a sorted-threshold lookup: searchsorted turns the
+# five-way branch ladder (unpredictable on real confidence distributions)
+# into one binary search, and maps a whole top-k array in a single call.
+_CERTAINTY_THRESHOLDS = np.array([0.3, 0.5, 0.7, 0.9])
+_CERTAINTY_LEVELS = ('Very Low', 'Low', 'Medium', 'High', 'Very High')
+_CONFIDENCE_TEXTS = (
+    ('The model is very uncertain about this prediction — '
+     'consider a clearer photo.'),
+    'The model sees some matching features but is unsure.',
+    'The model is moderately confident in this match.',
+    'The model is confident: key features match well.',
+    'The model is very confident in this identification.',
+)
+
+
+def _postprocess_cam(activations: torch.Tensor, gradients: torch.Tensor,
+                     out_h: int, out_w: int) -> torch.Tensor:
+    """Grad-CAM tail: weight, relu, normalize, upsample — one kernel."""
+    weights = gradients.mean(dim=[2, 3])
+    cam = torch.relu(torch.einsum('nchw,nc->nhw', activations, weights))
+    cmin = cam.min()
+    cam = (cam - cmin) / (cam.max() - cmin + 1e-8)
+    cam = F.interpolate(cam.unsqueeze(1), size=[out_h, out_w],
+                        mode='bilinear', align_corners=False)
+    return cam.squeeze()
+
+
+# Scripted so the fixed-shape elementwise chain fuses instead of running
+# five eager dispatches per request; falls back to eager if scripting
+# rejects the build's operator set.
+try:
+    _postprocess_cam = torch.jit.script(_postprocess_cam)
+except Exception:
+    pass
+
+
+class ModelExplainer:
+    """Explains a single classifier's predictions.
+
+    Holds forward hooks on the target layers, so one instance should be
+    shared per model, not built per request.
+    """
+
+    def __init__(self, model, class_names, target_layers=('layer4',)):
+        # NHWC weights: conv kernels pick tensor-core (and oneDNN)
+        # channels-last paths; stage_input converts uploads to match.
+        self.model = model.eval().to(memory_format=torch.channels_last)
+        self.class_names = class_names
+        self.target_layers = tuple(target_layers)
+        self.activations = {}
+        # The instance is shared by gthread's worker threads but its hook
+        # state (activations, last_features), the pinned staging buffer
+        # and the overlay scratch arrays are per-call: without this lock
+        # two concurrent /explain requests interleave the hook write
+        # between forward and autograd.grad and get each other's
+        # gradients. Reentrant so routes can hold it across a
+        # forward + last_features/overlay sequence while the methods
+        # take it themselves.
+        self.lock = threading.RLock()
+        self.db_matrix = None
+        self._register_hooks()
+        # Compiled entry point for the explanation forwards: Dynamo
+        # captures the graph once and inductor emits fused kernels, so
+        # repeat calls skip op-by-op eager dispatch. reduce-overhead adds
+        # CUDA-graph replay, which fits the fixed shapes used here.
+        try:
+            self._forward = torch.compile(self.model, mode='reduce-overhead',
+                                          fullgraph=False)
+        except Exception:  # older torch without compile, or no backend
+            self._forward = self.model
+        self.device = next(model.parameters()).device
+        # Pinned staging buffer for GPU uploads: page-locked memory lets
+        # the copy engine DMA asynchronously, so the transfer overlaps
+        # preceding compute instead of paying PCIe latency synchronously.
+        self._pin_buf = (torch.empty(1, 3, 224, 224, pin_memory=True)
+                         if self.device.type == 'cuda' else None)
+        # Overlay scratch buffers, reused across requests: the colormap
+        # and blend otherwise allocate ~450KB of fresh uint8 arrays per
+        # call. Guarded by self.lock, like the rest of the per-call state.
+        self._hm_u8 = np.empty((224, 224), np.uint8)
+        self._colored_buf = np.empty((224, 224, 3), np.uint8)
+        self._overlay_buf = np.empty((224, 224, 3), np.uint8)
+
+    def _register_hooks(self):
+        # Forward hooks only. The stored activation is NOT detached, so
+        # autograd.grad can differentiate the class score with respect to
+        # it directly — no deprecated backward hook, no retain_graph, and
+        # no gradient allocation for the network stem below the target.
+        def save_activation(name):
+            def hook(module, inputs, output):
+                self.activations[name] = output
+            return hook
+
+        # Exact-name match: a substring test against 'layer4' also hooked
+        # layer4.0, layer4.0.conv1 and the rest of the block — dozens of
+        # hooks firing and storing tensors on every forward.
+        self._handles = []
+        for name, module in self.model.named_modules():
+            if name in self.target_layers:
+                self._handles.append(
+                    module.register_forward_hook(save_activation(name)))
+
+        # Penultimate (pooled, 512-D) features from the same forward:
+        # this is what similarity search compares, not class scores.
+        self.last_features = None
+        pool = getattr(self.model, 'avgpool', None)
+        if pool is not None:
+            def save_features(module, inputs, output):
+                self.last_features = output.detach().flatten(1)
+            self._handles.append(pool.register_forward_hook(save_features))
+
+    def remove_hooks(self):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        self.activations.clear()
+
+    def _autocast(self):
+        # bf16 on GPU halves activation traffic and engages tensor cores;
+        # attributions are only ranked and overlaid, so the precision
+        # loss is immaterial. CPU inference stays fp32.
+        if self.device.type != 'cuda':
+            return contextlib.nullcontext()
+        return torch.autocast('cuda', dtype=torch.bfloat16)
+
+    def stage_input(self, array):
+        """Move a preprocessed (1, 3, 224, 224) float32 image to the
+        model's device, via the pinned buffer and an async copy on GPU.
+
+        The pinned buffer is shared: callers must hold self.lock from
+        here until the forward that consumes the upload has completed,
+        or the next request overwrites the buffer mid-transfer.
+        """
+        with self.lock:
+            tensor = torch.as_tensor(array)
+            if self._pin_buf is None:
+                return tensor.to(self.device,
+                                 memory_format=torch.channels_last)
+            self._pin_buf.copy_(tensor)
+            return self._pin_buf.to(self.device, non_blocking=True,
+                                    memory_format=torch.channels_last)
+
+    def generate_grad_cam(self, input_tensor, class_idx=None,
+                          layer_name='layer4'):
+        """Class-activation heatmap for one input, as a float array in
+        [0, 1] at the input's spatial size."""
+        with self.lock:
+            with self._autocast():
+                output = self._forward(input_tensor)
+                if class_idx is None:
+                    class_idx = int(output.argmax(dim=1))
+                activations = self.activations[layer_name]
+                # Differentiate only down to the hooked activation: the
+                # backward stops there instead of traversing the whole
+                # network and filling every parameter's .grad.
+                gradients = torch.autograd.grad(output[0, class_idx],
+                                                activations)[0]
+            # Stored activations carry the autograd graph; drop them so the
+            # whole forward isn't kept alive between requests.
+            self.activations.clear()
+        # Back to fp32 for the normalize/upsample tail.
+        cam = _postprocess_cam(activations.float(), gradients.float(),
+                               int(input_tensor.shape[2]),
+                               int(input_tensor.shape[3]))
+        return cam.cpu().numpy()
+
+    def forward_with_cam(self, input_tensor, layer_name='layer4'):
+        """One hooked forward yielding both logits and the Grad-CAM map
+        for the winning class.
+
+        Callers that need the probabilities and the heatmap (the explain
+        endpoints) pay a single model pass instead of one forward for
+        the softmax and another inside generate_grad_cam.
+        """
+        with self.lock:
+            with self._autocast():
+                output = self._forward(input_tensor)
+                class_idx = int(output.argmax(dim=1))
+                activations = self.activations[layer_name]
+                gradients = torch.autograd.grad(output[0, class_idx],
+                                                activations)[0]
+            self.activations.clear()
+        cam = _postprocess_cam(activations.float(), gradients.float(),
+                               int(input_tensor.shape[2]),
+                               int(input_tensor.shape[3]))
+        return output.detach(), cam.cpu().numpy()
+
+    def forward_with_cam_batch(self, batch, layer_name='layer4'):
+        """Batched forward_with_cam: one model pass for N stacked images.
+
+        Per-sample scores are summed before autograd.grad — samples are
+        independent, so the summed backward still yields each row's own
+        gradient. Only the O(H*W) normalize/upsample tail runs per
+        sample, for per-image heatmap scaling.
+        """
+        with self.lock:
+            with self._autocast():
+                output = self._forward(batch)
+                class_idx = output.argmax(dim=1)
+                activations = self.activations[layer_name]
+                score = output.gather(1, class_idx.unsqueeze(1)).sum()
+                gradients = torch.autograd.grad(score, activations)[0]
+            self.activations.clear()
+        height, width = int(batch.shape[2]), int(batch.shape[3])
+        cams = torch.stack([
+            _postprocess_cam(activations[i:i + 1].float(),
+                             gradients[i:i + 1].float(), height, width)
+            for i in range(batch.shape[0])
+        ])
+        return output.detach(), cams.cpu().numpy()
+
+    def generate_feature_importance(self, input_tensor, baseline=None,
+                                    n_steps=50):
+        """Integrated gradients, evaluated as one batched forward/backward.
+
+        All n_steps+1 interpolated inputs go through the model as a
+        single batch, so the path integral costs one launch schedule
+        instead of a Python loop of sequential forward+backward passes,
+        and the Riemann sum is a mean over the batch dimension.
+        """
+        if baseline is None:
+            baseline = torch.zeros_like(input_tensor)
+        alphas = torch.linspace(0, 1, n_steps + 1,
+                                device=input_tensor.device).view(-1, 1, 1, 1)
+        batch = (baseline + alphas * (input_tensor - baseline))
+        batch.requires_grad_(True)
+        # Under the lock even though the hooked activations go unused
+        # here: the hooks still fire, and an unlocked IG forward would
+        # clobber them between another request's forward and grad.
+        with self.lock, self._autocast():
+            output = self._forward(batch)
+            # Pick the class from the alpha=1 row (the real input) and
+            # keep the index a tensor: int() would force a device sync
+            # between the forward and backward, serializing the schedule.
+            class_idx = output[-1].argmax()
+            score = output.index_select(1, class_idx.view(1)).sum()
+            grads = torch.autograd.grad(score, batch)[0]
+            self.activations.clear()
+        attributions = grads.float().mean(dim=0, keepdim=True) \
+            * (input_tensor - baseline)
+        return attributions.detach()
+
+    # inference_mode, not just no_grad: these paths never need autograd,
+    # and skipping version-counter and view-metadata bookkeeping trims
+    # per-op CPU overhead at the small sizes involved. The Grad-CAM and
+    # IG paths stay outside it — they differentiate on purpose.
+
+    @torch.inference_mode()
+    def find_similar_images(self, input_features, image_database, top_k=5):
+        """Cosine-nearest entries of the feature database.
+
+        The database is normalized once into a single (N, D) matrix, so
+        a query is one matrix-vector product and a top-k selection
+        instead of N per-item normalize-and-dot calls.
+        """
+        q = F.normalize(torch.as_tensor(input_features).flatten(), dim=0)
+        with self.lock:
+            if self.db_matrix is None or len(self.db_matrix) != len(
+                    image_database):
+                stacked = torch.stack([torch.from_numpy(features).flatten()
+                                       for features in image_database])
+                self.db_matrix = F.normalize(stacked.float(),
+                                             dim=1).to(q.device)
+            db_matrix = self.db_matrix
+        sims = db_matrix @ q
+        values, indices = torch.topk(sims, min(top_k, sims.numel()))
+        # One stacked transfer for both result tensors; each .tolist()
+        # would otherwise sync the device separately.
+        indices, values = torch.stack(
+            (indices.to(values.dtype), values)).tolist()
+        return [{'index': int(idx), 'similarity': sim}
+                for idx, sim in zip(indices, values)]
+
+    def create_explanation_overlay(self, original_image, heatmap, alpha=0.4):
+        """Blend a jet-colored heatmap over the original image."""
+        original_np = np.asarray(original_image.resize((224, 224)))
+        with self.lock:
+            if _blend_overlay is not None:
+                _blend_overlay(original_np, heatmap.astype(np.float32),
+                               _JET_LUT, np.float32(alpha),
+                               self._overlay_buf)
+            else:
+                np.multiply(heatmap, 255, out=self._hm_u8, casting='unsafe')
+                np.take(_JET_LUT, self._hm_u8.ravel(), axis=0,
+                        out=self._colored_buf.reshape(-1, 3))
+                cv2.addWeighted(original_np, 1 - alpha, self._colored_buf,
+                                alpha, 0, dst=self._overlay_buf)
+            # Copy out: the scratch buffer is rewritten by the next request.
+            return Image.fromarray(self._overlay_buf.copy())
+
+    @torch.inference_mode()
+    def generate_confidence_explanation(self, probabilities):
+        """Top predictions plus an entropy-based certainty narrative."""
+        probs = probabilities.squeeze()
+        # Select and reduce on-device: topk is a partial selection where
+        # argsort was a full sort, entropy is one fused reduction, and
+        # only the k winners plus a scalar cross to the host.
+        values, indices = torch.topk(probs, min(5, probs.numel()))
+        entropy = -(probs * torch.log(probs + 1e-8)).sum()
+        values = values.tolist()
+        # One vectorized bucket lookup for the whole top-k.
+        levels = np.searchsorted(_CERTAINTY_THRESHOLDS, values,
+                                 side='right')
+        top_predictions = [
+            {
+                'class': self.class_names[i],
+                'probability': p,
+                'certainty': _CERTAINTY_LEVELS[level],
+            }
+            for i, p, level in zip(indices.tolist(), values, levels)
+        ]
+        return {
+            'top_predictions': top_predictions,
+            'entropy': float(entropy),
+            'explanation': self._generate_confidence_text(
+                top_predictions[0]['probability']),
+        }
+
+    def _get_certainty_level(self, confidence):
+        return _CERTAINTY_LEVELS[int(np.searchsorted(
+            _CERTAINTY_THRESHOLDS, confidence, side='right'))]
+
+    def _generate_confidence_text(self, confidence):
+        return _CONFIDENCE_TEXTS[int(np.searchsorted(
+            _CERTAINTY_THRESHOLDS, confidence, side='right'))]
+
+    # The tooltip text is pure dict/string assembly over a handful of
+    # popular classes; cached as statics (like the share-text builders in
+    # social_share) with confidence quantized to 1% buckets, repeat calls
+    # are a dict hit instead of fresh allocations.
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _get_class_specific_info(class_name):
+        return _CLASS_INFO.get(class_name, _DEFAULT_CLASS_INFO)
+
+    @staticmethod
+    def generate_educational_tooltip(class_name, confidence):
+        return dict(ModelExplainer._tooltip(class_name,
+                                            round(confidence, 2)))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _tooltip(class_name, confidence):
+        info = ModelExplainer._get_class_specific_info(class_name)
+        return {
+            'features': info['features'],
+            'learning': info['learning'],
+            'general': (f'The model matched this to {class_name} with '
+                        f'{confidence:.0%} confidence by comparing it '
+                        f'against learned visual patterns.'),
+        }
+
+    @staticmethod
+    def encode_heatmap_to_base64(heatmap):
+        """Float heatmap in [0, 1] as a base64 grayscale PNG."""
+        ok, buf = cv2.imencode('.png', (heatmap * 255).astype(np.uint8),
+                               [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            raise ValueError('PNG encode failed')
+        return base64.b64encode(buf).decode('ascii')
+
+    @staticmethod
+    def encode_image_to_png(image):
+        # libpng at compression level 1: overlays are viewed once, not
+        # archived, and level 1 cuts the DEFLATE loop (the dominant cost
+        # of PIL's default level 6) several-fold for a few percent size.
+        arr = np.asarray(image)
+        ok, buf = cv2.imencode('.png', cv2.cvtColor(arr, cv2.COLOR_RGB2BGR),
+                               [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            raise ValueError('PNG encode failed')
+        return buf.tobytes()
+
+    @staticmethod
+    def encode_image_to_base64(image):
+        return base64.b64encode(
+            ModelExplainer.encode_image_to_png(image)).decode('ascii')
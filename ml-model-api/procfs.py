@@ -0,0 +1,53 @@
+"""Minimal /proc readers for the few stats the API actually exposes.
+
+psutil parses whole /proc files into namedtuple object graphs on every
+call; health checks and the metrics sampler only need CPU percent and
+resident memory, so these read just the bytes required and parse them by
+hand.
+"""
+import os
+import threading
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+_cpu_lock = threading.Lock()
+_cpu_last = None
+
+
+def rss_bytes():
+    """Resident set size: second field of /proc/self/statm, in pages."""
+    with open('/proc/self/statm', 'rb') as f:
+        return int(f.read().split(b' ', 2)[1]) * _PAGE_SIZE
+
+
+def cpu_percent():
+    """System CPU percent since the previous call (0.0 on the first).
+
+    One read of the aggregate cpu line of /proc/stat; busy share is
+    computed from the jiffy deltas, the same way psutil does it, shared
+    across callers under one lock like psutil's module state.
+    """
+    global _cpu_last
+    with open('/proc/stat', 'rb') as f:
+        fields = f.readline().split()[1:]
+    values = [int(v) for v in fields]
+    idle = values[3] + values[4]  # idle + iowait
+    total = sum(values)
+    with _cpu_lock:
+        last, _cpu_last = _cpu_last, (total, idle)
+    if last is None:
+        return 0.0
+    busy = (total - last[0]) - (idle - last[1])
+    elapsed = total - last[0]
+    if elapsed <= 0:
+        return 0.0
+    return round(100.0 * busy / elapsed, 1)
+
+
+def mem_available_percent():
+    """MemAvailable as a share of MemTotal, from the head of /proc/meminfo."""
+    with open('/proc/meminfo', 'rb') as f:
+        buf = f.read(600)
+    total = int(buf[buf.index(b'MemTotal:') + 9:].split(None, 1)[0])
+    available = int(buf[buf.index(b'MemAvailable:') + 13:].split(None, 1)[0])
+    return round(100.0 * available / total, 1)
@@ -0,0 +1,207 @@
+"""HTTP routes for turning predictions into shareable social content."""
+import hashlib
+import io
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import orjson
+from flask import Blueprint, Response, current_app, g, jsonify, request
+from PIL import Image
+from werkzeug.exceptions import HTTPException
+
+import analytics
+from auth import api_key_or_jwt_required
+from social_share import CANVAS, HASHTAGS, SocialShareGenerator
+from validation import typed_route
+
+social_bp = Blueprint('social', __name__, url_prefix='/social')
+
+share_generator = SocialShareGenerator()
+
+# Recommended crop per platform (width, height); the rendered card itself
+# is one canvas size.
+PLATFORMS = {
+    'instagram': (1080, 1080),
+    'twitter': (1200, 675),
+    'facebook': (1200, 630),
+    'whatsapp': (800, 800),
+}
+
+
+def _static_json(payload):
+    """Serialized body plus ETag for a response that never changes."""
+    body = orjson.dumps(payload)
+    return body, hashlib.blake2b(body, digest_size=8).hexdigest()
+
+
+# /platforms and /templates are constants for the life of the process;
+# serialize once at import so each request is an If-None-Match compare or
+# a prebuilt-bytes Response.
+_PLATFORMS_BODY, _PLATFORMS_ETAG = _static_json({
+    'platforms': {name: {'width': w, 'height': h}
+                  for name, (w, h) in PLATFORMS.items()}})
+_TEMPLATES_BODY, _TEMPLATES_ETAG = _static_json(
+    {'templates': list(SocialShareGenerator.TEMPLATES)})
+
+
+def _serve_static(body, etag):
+    if request.if_none_match and etag in request.if_none_match:
+        return '', 304
+    return Response(body, mimetype='application/json', headers={
+        'ETag': etag, 'Cache-Control': 'public, max-age=3600'})
+
+
+@social_bp.route('/platforms', methods=['GET'])
+def get_supported_platforms():
+    return _serve_static(_PLATFORMS_BODY, _PLATFORMS_ETAG)
+
+
+@social_bp.route('/templates', methods=['GET'])
+def get_available_templates():
+    return _serve_static(_TEMPLATES_BODY, _TEMPLATES_ETAG)
+
+
+@social_bp.errorhandler(Exception)
+def _share_error(e):
+    """Log the traceback off-thread; the client only sees the type.
+
+    logger.exception hands the record to the logging queue — no stack
+    formatting happens here, and internal paths never reach the response.
+    """
+    if isinstance(e, HTTPException):
+        return e
+    current_app.logger.exception('share generation failed')
+    return jsonify({'error': type(e).__name__}), 500
+
+
+# Decoded-image LRU, keyed by content hash and target size: resending the
+# same photo (retries, trying several platforms) skips the JPEG decode
+# entirely. Entries are draft-scaled, so ~32 of them stay modest.
+_DECODE_CACHE = OrderedDict()
+_DECODE_LOCK = threading.Lock()
+_DECODE_CACHE_MAX = 32
+
+
+def _load_upload(file, target_size):
+    """Decode an uploaded image, caching the decoded result by content.
+
+    The stream is read in chunks through blake2b, same as the /predict
+    path; on a cache hit no decode runs at all. On a miss, draft() scales
+    JPEGs in the DCT domain during decode — far cheaper than decoding
+    full-size and resizing after — before the RGB convert.
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    buf = bytearray()
+    while chunk := file.stream.read(65536):
+        hasher.update(chunk)
+        buf += chunk
+    key = (hasher.digest(), target_size)
+
+    with _DECODE_LOCK:
+        image = _DECODE_CACHE.get(key)
+        if image is not None:
+            _DECODE_CACHE.move_to_end(key)
+            return image
+
+    image = Image.open(io.BytesIO(buf))
+    image.draft('RGB', target_size)
+    image = image.convert('RGB')
+
+    with _DECODE_LOCK:
+        _DECODE_CACHE[key] = image
+        if len(_DECODE_CACHE) > _DECODE_CACHE_MAX:
+            _DECODE_CACHE.popitem(last=False)
+    return image
+
+
+def _valid_conf(c):
+    """Finite confidence in [0, 1]; the c == c term rejects NaN, which
+    would otherwise slip into template math as silent garbage."""
+    return 0.0 <= c <= 1.0 and c == c
+
+
+def _share_params():
+    """Validated (label, confidence, platform, template), or an error
+    response in the second slot. Shared by both share handlers so the
+    checks live in one place."""
+    label = request.form.get('label', 'Unknown dish')
+    try:
+        confidence = float(request.form.get('confidence', 0))
+    except ValueError:
+        return None, (jsonify({'error': 'invalid confidence'}), 400)
+    if not _valid_conf(confidence):
+        return None, (jsonify(
+            {'error': 'confidence must be between 0 and 1'}), 400)
+    platform = request.form.get('platform', 'instagram')
+    if platform not in PLATFORMS:
+        return None, (jsonify({'error': f'unknown platform: {platform}'}), 400)
+    template = request.form.get('template', 'default')
+    if template not in SocialShareGenerator.TEMPLATES:
+        return None, (jsonify({'error': f'unknown template: {template}'}), 400)
+    return (label, confidence, platform, template), None
+
+
+@social_bp.route('/share', methods=['POST'])
+@api_key_or_jwt_required
+def generate_shareable_content():
+    """Rendered card, captions, share URLs and OG metadata in one response."""
+    file = request.files.get('image')
+    if file is None:
+        return jsonify({'error': 'no image provided'}), 400
+    params, error = _share_params()
+    if error is not None:
+        return error
+    label, confidence, platform, template = params
+
+    image = _load_upload(file, CANVAS)
+    payload = share_generator.create_shareable_response(
+        image, label, confidence, template,
+        base_url=request.url_root.rstrip('/'))
+    payload['hashtags'] = list(HASHTAGS)
+    payload['platform'] = platform
+    return jsonify(payload), 201
+
+
+@social_bp.route('/share-image', methods=['POST'])
+@api_key_or_jwt_required
+def generate_share_image():
+    """Render and return the share card JPEG, straight from memory."""
+    file = request.files.get('image')
+    if file is None:
+        return jsonify({'error': 'no image provided'}), 400
+    params, error = _share_params()
+    if error is not None:
+        return error
+    label, confidence, platform, template = params
+
+    image = _load_upload(file, CANVAS)
+    jpeg = share_generator.generate_shareable_image(image, label, confidence,
+                                                    template)
+    return Response(jpeg, mimetype='image/jpeg')
+
+
+# Event ids are pid + a process-local counter: unique across workers,
+# and next() on an itertools.count is one C call versus uuid4's
+# sixteen urandom bytes plus hex formatting per event.
+_pid = os.getpid()
+_event_counter = itertools.count()
+
+
+@social_bp.route('/track', methods=['POST'])
+@api_key_or_jwt_required
+@typed_route(label=str, platform=str)
+def track_sharing_analytics(label, platform):
+    """Record a share event; the write happens on the analytics thread."""
+    accepted = analytics.record({
+        'event_id': f'{_pid}-{next(_event_counter)}',
+        'label': label,
+        'platform': platform,
+        'user_id': str(g.user_id),
+        # Raw nanoseconds; the consumer can format. datetime.utcnow()
+        # plus isoformat() is string assembly we don't need per event.
+        'timestamp_ns': time.time_ns(),
+    })
+    return jsonify({'accepted': accepted}), 202
@@ -0,0 +1,244 @@
+"""Share-card rendering plus the text and metadata that travel with it."""
+import concurrent.futures
+import functools
+import io
+import threading
+from urllib.parse import quote
+
+try:
+    # SIMD (SSSE3/AVX2) base64: several GB/s versus the stdlib's scalar
+    # C loop, and the b64encode signature is drop-in compatible.
+    import pybase64 as _b64
+except ImportError:
+    import base64 as _b64
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+
+@functools.lru_cache(maxsize=None)
+def _get_font(name, size):
+    """Parsed TTF shared by every generator instance and size.
+
+    ImageFont.truetype reads and parses the font file per call; handlers
+    build a generator per request, so without this each request paid
+    three TTF parses.
+    """
+    try:
+        return ImageFont.truetype(name, size)
+    except OSError:
+        return ImageFont.load_default()
+
+CANVAS = (800, 600)
+
+HASHTAGS = ('#FlavorSnap', '#NigerianFood', '#FoodAI', '#Foodie')
+
+SHARE_PLATFORMS = ('twitter', 'facebook', 'whatsapp', 'instagram')
+
+
+# Render/encode runs here while the caller assembles texts and metadata.
+# Threads, not processes: the card renders from an already-decoded (and
+# LRU-cached) image, which a process pool would have to pickle wholesale,
+# and PIL's resize/encode codecs release the GIL anyway.
+_RENDER_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=4, thread_name_prefix='share-render')
+
+# URL builders keyed by platform: adding a platform is one entry here,
+# and dispatch is a dict lookup instead of a chain of string compares.
+# Instagram is absent on purpose — it has no web share intent.
+_URL_BUILDERS = {
+    'twitter': lambda text, base:
+        'https://twitter.com/intent/tweet?text=' + quote(text, safe=''),
+    'facebook': lambda text, base:
+        f'https://www.facebook.com/sharer/sharer.php?u={base}',
+    'whatsapp': lambda text, base:
+        'https://wa.me/?text=' + quote(text, safe=''),
+}
+
+_tls = threading.local()
+
+
+def _tile_buffer(key, size, fill):
+    """Per-thread reusable RGBA tile, reset with a paste (a C-level fill).
+
+    Allocating a fresh banner per request churns the allocator under
+    load; with gunicorn's fixed thread count this bounds live tiles to
+    threads x templates instead of one per request.
+    """
+    tiles = getattr(_tls, 'tiles', None)
+    if tiles is None:
+        tiles = _tls.tiles = {}
+    tile = tiles.get(key)
+    if tile is None or tile.size != size:
+        tile = tiles[key] = Image.new('RGBA', size, fill)
+    else:
+        tile.paste(fill, (0, 0) + size)
+    return tile
+
+
+@functools.lru_cache(maxsize=None)
+def _gradient_banner():
+    """The colorful template's gradient never changes; build it once."""
+    arr = np.zeros((100, 700, 4), dtype=np.uint8)
+    y = np.arange(100, dtype=np.uint8)[:, None]
+    arr[:, :, 0] = 255 - y
+    arr[:, :, 1] = 80 + y
+    arr[:, :, 2] = 120
+    arr[:, :, 3] = 220
+    return Image.fromarray(arr, 'RGBA')
+
+
+class SocialShareGenerator:
+    """Renders a prediction onto a shareable card and builds the
+    platform-specific text, URLs and Open Graph metadata around it."""
+
+    TEMPLATES = ('default', 'minimal', 'colorful')
+
+    def __init__(self):
+        self.title_font = _get_font('arial.ttf', 48)
+        self.body_font = _get_font('arial.ttf', 32)
+        self.small_font = _get_font('arial.ttf', 20)
+        # The title string never changes: rasterize its glyphs once here
+        # and paste the tile per render, skipping FreeType shaping and
+        # rasterization on the hot path.
+        self._title_tile = Image.new('RGBA', (400, 60), (0, 0, 0, 0))
+        ImageDraw.Draw(self._title_tile).text(
+            (0, 0), 'FlavorSnap AI', fill=(255, 255, 255, 255),
+            font=self.title_font)
+
+    def generate_shareable_image(self, image, label, confidence,
+                                 template='default', quality=82,
+                                 progressive=False, optimize=False,
+                                 persist=None):
+        """Render the card and return JPEG bytes, entirely in memory.
+
+        The encode goes straight into a BytesIO — no save-to-disk plus
+        re-read just to get bytes. Disk is only touched when the caller
+        passes a persist path.
+
+        quality defaults to 82: visually indistinguishable from 90 for
+        photos of food, noticeably smaller and faster to encode. Leave
+        optimize off on the hot path — the extra Huffman pass roughly
+        doubles encode time for a marginal size win. With pillow-simd
+        (an optional override; see the note in requirements.txt) the
+        encode and resize both run on libjpeg-turbo's SIMD paths.
+        """
+        # BILINEAR, not LANCZOS: at 800x600 followed by JPEG quantization
+        # the 6-tap filter is invisible, and the 2-tap one is ~3-4x
+        # cheaper. Upstream has already draft()-decoded near the target
+        # size, so this never downsamples by a large factor anyway.
+        img = image.convert('RGB').resize(CANVAS, Image.Resampling.BILINEAR)
+        # Templates composite themselves onto the card. The translucent
+        # ones render onto a banner-sized tile and paste it with its own
+        # alpha as the mask — blending just that region instead of an
+        # RGBA round-trip plus a full-canvas alpha_composite. Opaque
+        # templates skip the tile and draw straight into the RGB card.
+        getattr(self, f'_draw_{template}_template')(img, label, confidence)
+
+        buf = io.BytesIO()
+        img.save(buf, 'JPEG', quality=quality, progressive=progressive,
+                 optimize=optimize)
+        data = buf.getvalue()
+        if persist:
+            with open(persist, 'wb') as f:
+                f.write(data)
+        return data
+
+    _DATA_URI_PREFIX = b'data:image/jpeg;base64,'
+
+    @staticmethod
+    def to_data_uri(jpeg_bytes):
+        # memoryview feeds the encoder without copying the JPEG first;
+        # one bytes concat then a single ascii decode (the base64
+        # alphabet is pure ASCII, and ascii validates less than utf-8).
+        encoded = _b64.b64encode(memoryview(jpeg_bytes))
+        return (SocialShareGenerator._DATA_URI_PREFIX
+                + encoded).decode('ascii')
+
+    def _draw_default_template(self, img, label, confidence):
+        tile = _tile_buffer('default', (700, 130), (0, 0, 0, 200))
+        tile.paste(self._title_tile, (20, 20), self._title_tile)
+        ImageDraw.Draw(tile).text(
+            (20, 75), f'{label} — {confidence:.0%} confident',
+            fill=(255, 255, 255, 255), font=self.body_font)
+        img.paste(tile, (50, 450), tile)
+
+    def _draw_minimal_template(self, img, label, confidence):
+        # No tile and no blend: a solid banner over JPEG output is
+        # indistinguishable from the 200-alpha one, so draw the
+        # rectangle and text straight into the RGB card.
+        draw = ImageDraw.Draw(img)
+        draw.rectangle((0, 550, 800, 600), fill=(0, 0, 0))
+        draw.text((20, 560), f'{label} · FlavorSnap',
+                  fill=(255, 255, 255), font=self.small_font)
+
+    def _draw_colorful_template(self, img, label, confidence):
+        tile = _tile_buffer('colorful', (700, 130), (0, 0, 0, 0))
+        # Paste (no mask) copies all four bands of the prebuilt gradient.
+        tile.paste(_gradient_banner(), (0, 0))
+        draw = ImageDraw.Draw(tile)
+        draw.text((20, 20), label, fill=(255, 255, 255, 255),
+                  font=self.title_font)
+        draw.text((20, 75), f'{confidence:.0%} confident · FlavorSnap AI',
+                  fill=(255, 255, 255, 255), font=self.body_font)
+        img.paste(tile, (50, 400), tile)
+
+    # The text builders are static and lru_cached: users re-share the
+    # same top-1 label constantly, so with confidence quantized to 0.1%
+    # buckets the common case is a dict hit instead of string assembly.
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def generate_share_text(label, confidence, platform='twitter'):
+        text = (f'I just identified {label} with {confidence:.0%} '
+                f'confidence using FlavorSnap AI!')
+        hashtags = ' '.join(HASHTAGS)
+        if platform == 'twitter' and len(text) + len(hashtags) + 1 > 280:
+            text = text[:280 - len(hashtags) - 2] + '…'
+        return f'{text} {hashtags}'
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def generate_open_graph_metadata(label, confidence, base_url):
+        description = (f'FlavorSnap identified this dish as {label} '
+                       f'({confidence:.0%} confidence).')
+        return {
+            'og:title': f'{label} — identified by FlavorSnap AI',
+            'og:description': description,
+            'og:type': 'website',
+            'og:url': base_url,
+            'og:site_name': 'FlavorSnap',
+            'twitter:card': 'summary_large_image',
+            'twitter:title': f'{label} — FlavorSnap AI',
+            'twitter:description': description,
+        }
+
+    def create_shareable_response(self, image, label, confidence,
+                                  template='default',
+                                  base_url='https://flavorsnap.app'):
+        """Everything a client needs to share one prediction."""
+        # Kick off the dominant cost first; the text work below runs
+        # while the render thread resizes and encodes.
+        jpeg_future = _RENDER_POOL.submit(self.generate_shareable_image,
+                                          image, label, confidence, template)
+        conf_key = round(confidence, 3)
+        share_texts, share_urls = self._share_bundle(label, conf_key,
+                                                     base_url)
+        return {
+            'image_data': self.to_data_uri(jpeg_future.result()),
+            'share_texts': dict(share_texts),
+            'share_urls': dict(share_urls),
+            'og_metadata': dict(self.generate_open_graph_metadata(
+                label, conf_key, base_url)),
+        }
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _share_bundle(label, confidence, base_url):
+        """Texts and URLs for every platform, built once per key."""
+        texts = {p: SocialShareGenerator.generate_share_text(
+            label, confidence, p) for p in SHARE_PLATFORMS}
+        encoded_base = quote(base_url, safe=':/')
+        urls = {platform: builder(texts[platform], encoded_base)
+                for platform, builder in _URL_BUILDERS.items()}
+        return texts, urls
@@ -0,0 +1,122 @@
+"""Load and rate-limit smoke tests for the FlavorSnap API.
+
+Run against a live server:  python test_api.py [base_url]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+
+# aiohttp and numpy are only needed by the async load test; they are
+# imported inside it so the quick smoke checks start without paying for
+# either dependency graph.
+
+DEFAULT_BASE_URL = 'http://localhost:5000'
+TEST_IMAGE = 'test-food.jpg'
+
+
+class FlavorSnapAPITester:
+    def __init__(self, base_url=DEFAULT_BASE_URL, concurrent_users=10,
+                 requests_per_user=5):
+        self.base_url = base_url
+        self.concurrent_users = concurrent_users
+        self.requests_per_user = requests_per_user
+        with open(TEST_IMAGE, 'rb') as f:
+            self.image_bytes = f.read()
+        # Keep-alive session for the synchronous burst test; the load test
+        # below generates its traffic on the asyncio event loop instead.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=requests_per_user, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Connection': 'keep-alive'})
+
+    def make_request(self):
+        start = time.monotonic()
+        # Filename and content type matter: a bare bytes part arrives as
+        # application/octet-stream and the API's mimetype gate 415s it.
+        response = self.session.post(
+            f'{self.base_url}/predict',
+            files={'image': (TEST_IMAGE, self.image_bytes, 'image/jpeg')})
+        return response.status_code, time.monotonic() - start
+
+    def test_health_check(self):
+        response = self.session.get(f'{self.base_url}/health')
+        # Parse the body once, with orjson, instead of response.json().
+        data = orjson.loads(response.content) \
+            if response.status_code == 200 else None
+        print(f'health: {response.status_code} {data}')
+        return data
+
+    def test_classification_with_image(self):
+        response = self.session.post(
+            f'{self.base_url}/predict',
+            files={'image': (TEST_IMAGE, self.image_bytes, 'image/jpeg')})
+        data = orjson.loads(response.content) \
+            if response.status_code == 200 else None
+        label = data['label'] if data else None
+        print(f'classification: {response.status_code} label={label}')
+        return data
+
+    def test_classification_without_image(self):
+        response = self.session.post(f'{self.base_url}/predict')
+        data = orjson.loads(response.content) \
+            if response.status_code == 400 else None
+        print(f'missing image: {response.status_code} {data}')
+        return response.status_code
+
+    def test_rate_limiting(self, burst=12):
+        """Fire a burst of requests from one connection and count 429s."""
+        statuses = [self.make_request()[0] for _ in range(burst)]
+        limited = statuses.count(429)
+        print(f'rate limiting: {burst} requests -> {limited} limited')
+        return limited
+
+    async def _make_request(self, session):
+        import aiohttp
+        form = aiohttp.FormData()
+        form.add_field('image', self.image_bytes, filename=TEST_IMAGE,
+                       content_type='image/jpeg')
+        start = time.monotonic()
+        async with session.post(f'{self.base_url}/predict', data=form) as r:
+            await r.read()
+            return r.status, time.monotonic() - start
+
+    async def _run_load(self, total):
+        import aiohttp
+
+        # One event loop multiplexes every in-flight request, so concurrency
+        # is bounded by the connector limit rather than by OS threads.
+        connector = aiohttp.TCPConnector(limit=self.concurrent_users,
+                                         keepalive_timeout=30)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            return await asyncio.gather(
+                *(self._make_request(session) for _ in range(total)))
+
+    def test_load_performance(self):
+        """Fan out concurrent_users * requests_per_user uploads via asyncio."""
+        import numpy as np
+
+        total = self.concurrent_users * self.requests_per_user
+        results = asyncio.run(self._run_load(total))
+
+        latencies = [latency for _, latency in results]
+        ok = sum(1 for status, _ in results if status == 200)
+        print(f'load test: {ok}/{len(results)} ok, '
+              f'mean {statistics.mean(latencies) * 1000:.1f}ms, '
+              f'p95 {np.percentile(latencies, 95) * 1000:.1f}ms')
+        return results
+
+
+if __name__ == '__main__':
+    tester = FlavorSnapAPITester(*sys.argv[1:2])
+    tester.test_health_check()
+    tester.test_classification_with_image()
+    tester.test_classification_without_image()
+    tester.test_rate_limiting()
+    tester.test_load_performance()
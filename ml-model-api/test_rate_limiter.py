@@ -0,0 +1,81 @@
+"""Rate-limit behavior tests against a live server.
+
+Run:  python test_rate_limiter.py [base_url]
+"""
+import asyncio
+import io
+import sys
+
+import requests
+
+DEFAULT_BASE_URL = 'http://localhost:5000'
+
+
+def _test_jpeg():
+    """A tiny but valid JPEG, generated once and reused as bytes.
+
+    Bytes, not an open file handle: a handle shared across posts sits at
+    EOF after the first upload and silently sends empty bodies, which
+    would rate-limit a different code path than the one under test. The
+    1x1 image also keeps the payload a few hundred bytes while still
+    exercising the server's real decode path.
+    """
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new('RGB', (1, 1)).save(buf, 'JPEG')
+    return buf.getvalue()
+
+
+def test_predict_rate_limit(session, base_url, data, burst=12):
+    """Burst past the /predict per-minute limit on one keep-alive
+    connection and count the 429s."""
+    statuses = []
+    for _ in range(burst):
+        r = session.post(f'{base_url}/predict',
+                         files={'image': ('test.jpg', data, 'image/jpeg')})
+        statuses.append(r.status_code)
+    limited = statuses.count(429)
+    print(f'predict burst: {burst} requests -> {limited} limited')
+    return limited
+
+
+def test_health_not_limited(session, base_url, count=30):
+    """Probes must never trip the limiter."""
+    codes = [session.get(f'{base_url}/health').status_code
+             for _ in range(count)]
+    limited = codes.count(429)
+    print(f'health burst: {count} requests -> {limited} limited')
+    return limited
+
+
+async def _concurrent_predicts(base_url, data, total):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        responses = await asyncio.gather(
+            *(client.post('/predict',
+                          files={'image': ('test.jpg', data, 'image/jpeg')})
+              for _ in range(total)))
+    return [r.status_code for r in responses]
+
+
+def test_predict_concurrent(base_url, data, total=50):
+    """Fire genuinely concurrent requests so the limiter's atomic counter
+    path is exercised, not just the sequential one."""
+    statuses = asyncio.run(_concurrent_predicts(base_url, data, total))
+    limited = statuses.count(429)
+    print(f'concurrent: {total} requests -> {limited} limited, '
+          f'{statuses.count(200)} ok')
+    return limited
+
+
+if __name__ == '__main__':
+    base_url = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_BASE_URL
+    data = _test_jpeg()
+    # One Session for the sequential tests: keep-alive means one TCP
+    # handshake for the whole burst instead of one per request.
+    session = requests.Session()
+    test_health_not_limited(session, base_url)
+    test_predict_rate_limit(session, base_url, data)
+    test_predict_concurrent(base_url, data)
@@ -0,0 +1,163 @@
+"""Batched asynchronous file writes over io_uring, with a blocking fallback.
+
+A multi-image submission used to pay one blocking write() round-trip per
+file. Here every buffer in a batch becomes one IORING_OP_WRITE SQE, the
+whole batch is pushed to the kernel with a single submit, and completions
+are reaped in one pass — O(1) syscalls per batch instead of O(N).
+"""
+import concurrent.futures
+import os
+import queue
+import threading
+
+try:
+    import liburing
+except ImportError:  # io_uring is a fast path, not a requirement
+    liburing = None
+
+
+class UringOp:
+    __slots__ = ('fd', 'buf', 'length', 'result')
+
+    def __init__(self, fd, buf):
+        self.fd = fd
+        self.buf = buf
+        self.length = len(buf)
+        self.result = None
+
+
+class IoUringBatchEngine:
+    """Daemon thread that owns one io_uring and writes batches through it."""
+
+    QUEUE_DEPTH = 64
+
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._ring = liburing.io_uring()
+        # SQPOLL: a kernel-side poller picks SQEs up without a submit
+        # syscall once warm; SQ_AFF pins it to one core so it doesn't
+        # migrate, and it dozes after 2s idle.
+        params = liburing.io_uring_params()
+        params.flags = (liburing.IORING_SETUP_SQPOLL |
+                        liburing.IORING_SETUP_SQ_AFF)
+        params.sq_thread_idle = 2000
+        try:
+            liburing.io_uring_queue_init_params(
+                self.QUEUE_DEPTH, self._ring, params)
+        except OSError:
+            # SQPOLL needs privileges on older kernels; plain ring still
+            # gives batched submission.
+            liburing.io_uring_queue_init(self.QUEUE_DEPTH, self._ring, 0)
+        threading.Thread(target=self._run, daemon=True,
+                         name='uring-writer').start()
+
+    def submit_batch(self, ops):
+        """Queue a batch of UringOps; returns an Event set on completion."""
+        done = threading.Event()
+        self._jobs.put((ops, done))
+        return done
+
+    def _run(self):
+        while True:
+            ops, done = self._jobs.get()
+            try:
+                # The SQ holds QUEUE_DEPTH entries; a larger batch would
+                # exhaust it and get_sqe would hand back a null SQE. Go
+                # through in ring-sized chunks instead — one SQE per
+                # buffer, one submit and one reap pass per chunk.
+                for start in range(0, len(ops), self.QUEUE_DEPTH):
+                    self._run_chunk(ops[start:start + self.QUEUE_DEPTH])
+            finally:
+                done.set()
+
+    def _run_chunk(self, ops):
+        for op in ops:
+            sqe = liburing.io_uring_get_sqe(self._ring)
+            while not sqe:
+                # SQ slots free when the kernel consumes entries, so a
+                # submit drains whatever is pending and retries.
+                liburing.io_uring_submit(self._ring)
+                sqe = liburing.io_uring_get_sqe(self._ring)
+            liburing.io_uring_prep_write(sqe, op.fd, op.buf, op.length, 0)
+        liburing.io_uring_submit(self._ring)
+
+        # Reap completions in batches: one peek drains everything ready
+        # and one cq_advance acknowledges the lot, instead of a wait/seen
+        # syscall pair per CQE.
+        cqes = liburing.io_uring_cqes(len(ops))
+        reaped = 0
+        while reaped < len(ops):
+            count = liburing.io_uring_peek_batch_cqe(
+                self._ring, cqes, len(ops) - reaped)
+            if count == 0:
+                liburing.io_uring_wait_cqe(self._ring, cqes)
+                continue
+            for i in range(count):
+                ops[reaped + i].result = cqes[i].res
+            liburing.io_uring_cq_advance(self._ring, count)
+            reaped += count
+
+
+# Portable fallback: write() releases the GIL, so a small thread pool
+# overlaps the per-file disk latency that a sequential loop would stack.
+_FALLBACK_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=8, thread_name_prefix='upload')
+
+
+def _write_one(item):
+    path, buf = item
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC,
+                 0o644)
+    try:
+        os.write(fd, buf)
+    finally:
+        os.close(fd)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def _get_engine():
+    global _engine
+    if liburing is None:
+        return None
+    with _engine_lock:
+        if _engine is None:
+            _engine = IoUringBatchEngine()
+    return _engine
+
+
+def save_buffers(items, timeout=30):
+    """Write (path, buffer) pairs to disk, batched when io_uring is available.
+
+    Without liburing the writes fan out over a bounded thread pool via
+    os.open/os.write — no Python file-object layer, and pool.map re-raises
+    the first failure.
+    """
+    engine = _get_engine()
+    if engine is None:
+        list(_FALLBACK_POOL.map(_write_one, items))
+        return
+
+    fds = []
+    try:
+        ops = []
+        for path, buf in items:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            fds.append(fd)
+            ops.append(UringOp(fd, buf))
+        done = engine.submit_batch(ops)
+        if not done.wait(timeout):
+            raise TimeoutError('io_uring batch write timed out')
+        for op, (path, _) in zip(ops, items):
+            # No result means the op was never submitted or reaped — the
+            # file exists but is empty/truncated; that is a failure, not
+            # a success to pass over silently.
+            if op.result is None:
+                raise OSError(f'io_uring write never completed: {path}')
+            if op.result < 0:
+                raise OSError(-op.result, os.strerror(-op.result), path)
+    finally:
+        for fd in fds:
+            os.close(fd)
@@ -0,0 +1,264 @@
+"""Explainability endpoints wrapping ModelExplainer.
+
+Registered by the torch-serving deployment once a model is loaded via
+initialize_explainer(); the ONNX-only API process does not mount it.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from flask import Blueprint, Response, jsonify, request
+from PIL import Image
+
+from auth import api_key_or_jwt_required
+from model_explainer import ModelExplainer
+
+xai_bp = Blueprint('xai', __name__, url_prefix='/explain')
+
+# ImageNet normalization pre-scaled by 255, so the uint8 image goes to
+# normalized floats in one subtract/divide with no ToTensor div pass.
+_MEAN = torch.tensor([0.485, 0.456, 0.406]).view(3, 1, 1) * 255
+_STD = torch.tensor([0.229, 0.224, 0.225]).view(3, 1, 1) * 255
+
+
+def fast_preprocess(image):
+    """PIL image to a normalized [1, 3, 224, 224] float tensor.
+
+    np.asarray reads PIL's buffer directly — ToTensor goes through
+    tobytes(), which encodes in fixed-size chunks and joins a list —
+    and the normalize is fused into one in-place subtract/divide.
+    """
+    image = image.resize((224, 224), Image.Resampling.BILINEAR)
+    arr = np.asarray(image, dtype=np.uint8)
+    tensor = torch.from_numpy(arr).permute(2, 0, 1).float()
+    return tensor.sub_(_MEAN).div_(_STD).unsqueeze(0)
+
+
+explainer = None
+_feature_db = None
+
+# Rendered overlay PNGs, shared between the JSON handler that produced
+# them and the binary fetch below; base64 inflates the payload 4/3x and
+# JSON string-escaping adds another full pass, so the JSON response
+# carries a short-lived URL instead. Same shape as the decode LRU in
+# social_routes.
+_OVERLAY_CACHE = OrderedDict()
+_OVERLAY_CACHE_MAX = 32
+_OVERLAY_TTL = 60.0
+_overlay_lock = threading.Lock()
+
+
+def _cache_overlay_png(png):
+    token = hashlib.blake2b(png, digest_size=16).hexdigest()
+    with _overlay_lock:
+        _OVERLAY_CACHE[token] = (time.monotonic(), png)
+        _OVERLAY_CACHE.move_to_end(token)
+        while len(_OVERLAY_CACHE) > _OVERLAY_CACHE_MAX:
+            _OVERLAY_CACHE.popitem(last=False)
+    return token
+
+
+def _fetch_overlay_png(token):
+    with _overlay_lock:
+        entry = _OVERLAY_CACHE.get(token)
+        if entry is None or time.monotonic() - entry[0] > _OVERLAY_TTL:
+            _OVERLAY_CACHE.pop(token, None)
+            return None
+        return entry[1]
+
+
+def initialize_explainer(model, class_names, feature_database=None):
+    """Bind the blueprint to a loaded torch model. Call once at startup."""
+    global explainer, _feature_db
+    # Serving shape is fixed at [N, 3, 224, 224]: cuDNN can autotune its
+    # conv algorithms once, and TF32 matmul costs nothing measurable in
+    # explanation quality.
+    torch.backends.cudnn.benchmark = True
+    torch.backends.cudnn.allow_tf32 = True
+    torch.set_float32_matmul_precision('high')
+    explainer = ModelExplainer(model, class_names)
+    _feature_db = feature_database
+    # ModelExplainer already wraps the model in torch.compile; one dummy
+    # pass at the serving shape triggers Dynamo capture here, at startup,
+    # so the first user request doesn't pay compile time.
+    try:
+        with torch.inference_mode():
+            explainer._forward(torch.zeros(1, 3, 224, 224,
+                                           device=explainer.device))
+    except Exception:
+        pass
+    finally:
+        explainer.activations.clear()
+    return explainer
+
+
+def _load_input():
+    """Decode the uploaded image and return (pil_image, input_tensor).
+
+    Call under explainer.lock: stage_input uploads through the shared
+    pinned buffer with an async copy, so the lock must be held from
+    here until the forward that consumes the transfer has run.
+    """
+    file = request.files.get('image')
+    if file is None:
+        return None, None
+    image = Image.open(file.stream).convert('RGB')
+    return image, explainer.stage_input(fast_preprocess(image))
+
+
+@xai_bp.route('/grad-cam', methods=['POST'])
+@api_key_or_jwt_required
+def grad_cam():
+    with explainer.lock:
+        image, tensor = _load_input()
+        if tensor is None:
+            return jsonify({'error': 'image file required'}), 400
+        logits, heatmap = explainer.forward_with_cam(tensor)
+        probs = F.softmax(logits, dim=1)
+        class_idx = int(probs.argmax(dim=1))
+        overlay = explainer.create_explanation_overlay(image, heatmap)
+    token = _cache_overlay_png(explainer.encode_image_to_png(overlay))
+    return jsonify({
+        'class_name': explainer.class_names[class_idx],
+        'confidence': float(probs[0, class_idx]),
+        # PNG, not a nested list: tolist() built ~50k Python ints and a
+        # megabyte-plus JSON array per heatmap.
+        'heatmap_data': explainer.encode_heatmap_to_base64(heatmap),
+        'heatmap_encoding': 'png;base64',
+        # The overlay ships as raw PNG from the endpoint below rather
+        # than base64 embedded here, cutting its wire size by a third.
+        'overlay_url': f'/explain/grad-cam-image?token={token}',
+    })
+
+
+@xai_bp.route('/grad-cam-image', methods=['GET'])
+@api_key_or_jwt_required
+def grad_cam_image():
+    png = _fetch_overlay_png(request.args.get('token', ''))
+    if png is None:
+        return jsonify({'error': 'unknown or expired token'}), 404
+    return Response(png, mimetype='image/png')
+
+
+@xai_bp.route('/batch-grad-cam', methods=['POST'])
+@api_key_or_jwt_required
+def batch_grad_cam():
+    """Grad-CAM for several images in one model pass.
+
+    Stacking the uploads into a single [N, 3, 224, 224] batch amortizes
+    kernel-launch overhead and keeps the matmuls GEMM-shaped instead of
+    N separate single-image forwards.
+    """
+    files = request.files.getlist('images')
+    if not files:
+        return jsonify({'error': 'at least one image file required'}), 400
+    tensors = [fast_preprocess(Image.open(f.stream).convert('RGB'))
+               for f in files]
+    # Direct transfer: the pinned staging buffer is sized for a single
+    # image, and a variable-N batch wouldn't fit it.
+    batch = torch.cat(tensors).to(
+        explainer.device, memory_format=torch.channels_last)
+    logits, heatmaps = explainer.forward_with_cam_batch(batch)
+    probs = F.softmax(logits, dim=1)
+    indices = probs.argmax(dim=1).tolist()
+    return jsonify({'heatmap_encoding': 'png;base64', 'results': [
+        {
+            'class_name': explainer.class_names[idx],
+            'confidence': float(probs[i, idx]),
+            'heatmap_data': explainer.encode_heatmap_to_base64(heatmaps[i]),
+        }
+        for i, idx in enumerate(indices)
+    ]})
+
+
+@xai_bp.route('/feature-importance', methods=['POST'])
+@api_key_or_jwt_required
+def feature_importance():
+    with explainer.lock:
+        _, tensor = _load_input()
+        if tensor is None:
+            return jsonify({'error': 'image file required'}), 400
+        attributions = explainer.generate_feature_importance(tensor)
+    importance = attributions.abs().sum(dim=1).squeeze()
+    importance = importance / (importance.max() + 1e-8)
+    return jsonify({
+        'importance_map': importance.cpu().numpy().tolist(),
+        'total_attribution': float(attributions.sum()),
+    })
+
+
+@xai_bp.route('/confidence', methods=['POST'])
+@api_key_or_jwt_required
+def confidence():
+    # Under the explainer lock: the raw forward still fires the hooks,
+    # and an unlocked one can clobber another request's captured
+    # activations between its forward and autograd.grad.
+    with explainer.lock:
+        _, tensor = _load_input()
+        if tensor is None:
+            return jsonify({'error': 'image file required'}), 400
+        with torch.inference_mode():
+            probs = F.softmax(explainer.model(tensor), dim=1)
+    return jsonify(explainer.generate_confidence_explanation(probs))
+
+
+@xai_bp.route('/similar', methods=['POST'])
+@api_key_or_jwt_required
+def similar():
+    if _feature_db is None:
+        return jsonify({'error': 'no feature database configured'}), 503
+    # The lock spans the forward and the last_features read: the avgpool
+    # hook writes shared state, and a concurrent request's forward would
+    # replace it between the two statements.
+    with explainer.lock:
+        _, tensor = _load_input()
+        if tensor is None:
+            return jsonify({'error': 'image file required'}), 400
+        with torch.inference_mode():
+            explainer.model(tensor)
+        # The avgpool hook captured the pooled 512-D embedding from that
+        # forward — the softmax vector this handler used to pass
+        # describes class membership, not visual similarity.
+        matches = explainer.find_similar_images(explainer.last_features,
+                                                _feature_db)
+    return jsonify({'matches': matches})
+
+
+@xai_bp.route('/comprehensive', methods=['POST'])
+@api_key_or_jwt_required
+def comprehensive():
+    # One hooked forward feeds every sub-explanation: the logits give
+    # the class, softmax and similarity inputs, and the cached layer4
+    # activation gives Grad-CAM its gradient source. Each block below
+    # previously paid its own full model pass. The reentrant lock is
+    # held for the whole sequence so last_features still belongs to this
+    # request's forward when similarity reads it.
+    with explainer.lock:
+        image, tensor = _load_input()
+        if tensor is None:
+            return jsonify({'error': 'image file required'}), 400
+        logits, heatmap = explainer.forward_with_cam(tensor)
+        probs = F.softmax(logits, dim=1)
+        class_idx = int(probs.argmax(dim=1))
+        class_name = explainer.class_names[class_idx]
+        confidence_value = float(probs[0, class_idx])
+
+        overlay = explainer.create_explanation_overlay(image, heatmap)
+        token = _cache_overlay_png(explainer.encode_image_to_png(overlay))
+        response = {
+            'class_name': class_name,
+            'confidence': confidence_value,
+            'overlay_url': f'/explain/grad-cam-image?token={token}',
+            'confidence_explanation':
+                explainer.generate_confidence_explanation(probs),
+            'tooltip': explainer.generate_educational_tooltip(
+                class_name, confidence_value),
+        }
+        if _feature_db is not None:
+            response['similar'] = explainer.find_similar_images(
+                explainer.last_features, _feature_db)
+    return jsonify(response)
@@ -0,0 +1,336 @@
+"""Fine-tune ResNet18 on the FlavorSnap food dataset.
+
+Script form of train_model.ipynb, kept importable so the serving side
+can reuse create_model and the class handling.
+"""
+import os
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset
+from torchvision import models
+from torchvision.datasets import ImageFolder
+from torchvision.transforms import v2
+from tqdm import tqdm
+
+try:
+    # Pre-decoded dataset cache: epochs read pre-resized RGB from one
+    # contiguous file instead of re-decoding every JPEG, which dominates
+    # epoch time once the GPU side is fast. Optional, like liburing in
+    # the API's upload path.
+    from ffcv.fields import IntField, RGBImageField
+    from ffcv.fields.decoders import IntDecoder, SimpleRGBImageDecoder
+    from ffcv.loader import Loader, OrderOption
+    from ffcv.transforms import (NormalizeImage, RandomHorizontalFlip,
+                                 Squeeze, ToDevice, ToTensor, ToTorchImage)
+    from ffcv.writer import DatasetWriter
+    HAS_FFCV = True
+except ImportError:
+    HAS_FFCV = False
+
+DATA_DIR = 'data/train'
+MODEL_PATH = 'models/best_model.pth'
+NUM_EPOCHS = 15
+BATCH_SIZE = 16
+LEARNING_RATE = 0.001
+WEIGHT_DECAY = 1e-4
+VAL_SPLIT = 0.2
+BETON_PATH = MODEL_PATH + '.beton'
+
+device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+# Every batch is [N, 3, 224, 224]: let cuDNN autotune conv algorithms
+# once on the first batch, and allow TF32 — negligible accuracy impact
+# for fine-tuning, large matmul throughput win on Ampere+.
+torch.backends.cudnn.benchmark = True
+torch.backends.cudnn.allow_tf32 = True
+torch.set_float32_matmul_precision('high')
+# fp16 with loss scaling on GPU (tensor cores, halved activation
+# traffic); CPU autocast only supports bf16 and needs no scaler.
+_AMP_DTYPE = torch.float16 if device.type == 'cuda' else torch.bfloat16
+
+# Augmentation split: workers only decode and resize to uint8 tensors
+# (cheap, collate-friendly); the rotation/jitter/affine work that used
+# to run as per-image PIL calls executes here on the whole batch as
+# device kernels, once per step.
+#
+# No Normalize anywhere in these pipelines: the API serves this
+# checkpoint with Resize+ToTensor only (see load_ml_components in
+# ml-model-api/app.py), so training must see the same [0, 1] inputs or
+# the deployed model silently predicts garbage.
+_GPU_AUGMENT = nn.Sequential(
+    v2.RandomCrop(224),
+    v2.RandomHorizontalFlip(),
+    v2.RandomRotation(15),
+    v2.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2),
+    v2.RandomAffine(0, translate=(0.1, 0.1), scale=(0.9, 1.1)),
+    v2.ToDtype(torch.float32, scale=True),
+).to(device)
+
+_GPU_PREPROCESS = nn.Sequential(
+    v2.ToDtype(torch.float32, scale=True),
+).to(device)
+
+
+class _TransformView(Dataset):
+    """A view over one scanned ImageFolder with its own transform.
+
+    Train and val share the single directory walk instead of each
+    re-scanning and re-stating every file just to change transforms.
+    """
+
+    def __init__(self, base, indices, transform):
+        self.samples = base.samples
+        self.indices = indices
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        path, label = self.samples[self.indices[i]]
+        return self.transform(Image.open(path).convert('RGB')), label
+
+
+def write_beton(out_path=BETON_PATH):
+    """One-time: bake the dataset into a pre-decoded .beton cache."""
+    base = ImageFolder(root=DATA_DIR)
+    writer = DatasetWriter(out_path, {
+        'image': RGBImageField(max_resolution=256),
+        'label': IntField(),
+    })
+    writer.from_indexed_dataset(base)
+
+
+def _split_indices(n):
+    """Deterministic train/val permutation shared by both loader paths.
+
+    Seeded so the beton path and the ImageFolder path carve out the
+    same disjoint subsets, and a resumed run validates on the same
+    images it never trained on.
+    """
+    rng = np.random.default_rng(0)
+    indices = rng.permutation(n)
+    val_size = int(VAL_SPLIT * n)
+    return indices[val_size:], indices[:val_size]
+
+
+def _ffcv_loaders():
+    base = _scan_dataset()
+    classes = base.classes
+    # The beton stores samples in ImageFolder order, so the index split
+    # carries over directly — each loader reads only its own subset
+    # instead of both walking the full file (which made validation run
+    # on the training set).
+    train_idx, val_idx = _split_indices(len(base.samples))
+    # Scale-only, matching the serving pipeline (no mean/std shift).
+    mean = np.zeros(3, dtype=np.float32)
+    std = np.full(3, 255.0, dtype=np.float32)
+    label_pipeline = [IntDecoder(), ToTensor(), Squeeze(), ToDevice(device)]
+
+    def loader(indices, flip):
+        image_pipeline = [SimpleRGBImageDecoder()]
+        if flip:
+            image_pipeline.append(RandomHorizontalFlip())
+        image_pipeline += [ToTensor(), ToTorchImage(), ToDevice(device),
+                           NormalizeImage(mean, std, np.float32)]
+        return Loader(BETON_PATH, batch_size=BATCH_SIZE,
+                      num_workers=min(8, os.cpu_count() or 1),
+                      indices=indices,
+                      order=OrderOption.QUASI_RANDOM if flip
+                      else OrderOption.SEQUENTIAL,
+                      pipelines={'image': image_pipeline,
+                                 'label': label_pipeline})
+
+    return loader(train_idx, flip=True), loader(val_idx, flip=False), classes
+
+
+def _scan_dataset():
+    """ImageFolder's index (samples/targets/classes), cached to disk.
+
+    The directory walk re-stats every file on each run; the cache keys
+    on DATA_DIR's mtime — adding or removing a class bumps it — and cuts
+    startup to one stat plus a pickle load.
+    """
+    cache_path = MODEL_PATH + '.idx.pkl'
+    mtime = os.path.getmtime(DATA_DIR)
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+        if cached['mtime'] == mtime:
+            return SimpleNamespace(samples=cached['samples'],
+                                   targets=cached['targets'],
+                                   classes=cached['classes'])
+    except (OSError, pickle.PickleError, KeyError, EOFError):
+        pass
+    base = ImageFolder(root=DATA_DIR)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'wb') as f:
+            pickle.dump({'mtime': mtime, 'samples': base.samples,
+                         'targets': base.targets,
+                         'classes': base.classes}, f)
+    except OSError:
+        pass
+    return base
+
+
+def create_dataloaders():
+    if HAS_FFCV and os.path.exists(BETON_PATH):
+        print(f'Using pre-decoded dataset cache {BETON_PATH}')
+        return _ffcv_loaders()
+    train_transform = v2.Compose([
+        v2.ToImage(),
+        v2.Resize((256, 256), antialias=True),
+        v2.ToDtype(torch.uint8, scale=False),
+    ])
+    val_transform = v2.Compose([
+        v2.ToImage(),
+        v2.Resize((224, 224), antialias=True),
+        v2.ToDtype(torch.uint8, scale=False),
+    ])
+
+    # No transform here: the splits carry their own via _TransformView,
+    # so the scan doesn't hold an unused pipeline.
+    full_dataset = _scan_dataset()
+    class_names = full_dataset.classes
+    num_classes = len(class_names)
+
+    print(f'Found {len(full_dataset.samples)} images '
+          f'in {num_classes} classes:')
+    # ImageFolder already keeps the labels as a plain int list in
+    # .targets — bincount it directly, no tuple unpacking over .samples.
+    counts = np.bincount(np.asarray(full_dataset.targets, dtype=np.int64),
+                         minlength=num_classes)
+    for idx, name in enumerate(class_names):
+        print(f'  - {name}: {counts[idx]} images')
+
+    train_idx, val_idx = _split_indices(len(full_dataset.samples))
+    train_indices = train_idx.tolist()
+    val_indices = val_idx.tolist()
+
+    train_dataset = _TransformView(full_dataset, train_indices,
+                                   train_transform)
+    val_dataset = _TransformView(full_dataset, val_indices, val_transform)
+
+    # Decode and augmentation run in worker processes so the train step
+    # never waits on PIL: persistent workers skip the per-epoch respawn,
+    # prefetch keeps batches queued ahead of the consumer, and pinned
+    # memory lets the GPU copies run asynchronously.
+    loader_kwargs = {
+        'num_workers': min(8, os.cpu_count() or 1),
+        'persistent_workers': True,
+        'prefetch_factor': 4,
+        'pin_memory': device.type == 'cuda',
+    }
+    train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE,
+                              shuffle=True, **loader_kwargs)
+    val_loader = DataLoader(val_dataset, batch_size=BATCH_SIZE,
+                            **loader_kwargs)
+    return train_loader, val_loader, class_names
+
+
+def create_model(num_classes):
+    model = models.resnet18(weights='IMAGENET1K_V1')
+    # Transfer learning on a small dataset: freeze the backbone so the
+    # backward touches only the head's num_classes x 512 weights, not
+    # all ~11M parameters, and the optimizer carries no state for them.
+    for param in model.parameters():
+        param.requires_grad = False
+    model.fc = nn.Linear(model.fc.in_features, num_classes)
+    # NHWC weights: conv kernels on Ampere+ tensor cores (and oneDNN on
+    # CPU) are fastest channels-last; inputs follow in the loops.
+    return model.to(device, memory_format=torch.channels_last)
+
+
+def train_epoch(model, loader, criterion, optimizer, scaler, epoch):
+    model.train()
+    # Accumulate on-device: every .item() is a full GPU sync, and two per
+    # batch serialized the pipeline. One sync per epoch at the return.
+    running_loss = torch.zeros((), device=device)
+    correct = torch.zeros((), device=device, dtype=torch.long)
+    total = 0
+    # tqdm redraws in place at most once a second — no per-print stdout
+    # flush, and no loss.item() sync except at the postfix updates.
+    pbar = tqdm(loader, desc=f'Epoch {epoch + 1}', mininterval=1.0,
+                leave=False)
+    for batch_idx, (images, labels) in enumerate(pbar):
+        images = images.to(device, non_blocking=True,
+                           memory_format=torch.channels_last)
+        labels = labels.to(device, non_blocking=True)
+        images = _GPU_AUGMENT(images)
+        optimizer.zero_grad()
+        with torch.autocast(device_type=device.type, dtype=_AMP_DTYPE):
+            outputs = model(images)
+            loss = criterion(outputs, labels)
+        scaler.scale(loss).backward()
+        scaler.step(optimizer)
+        scaler.update()
+        running_loss += loss.detach()
+        correct += outputs.argmax(dim=1).eq(labels).sum()
+        total += labels.size(0)
+        # Rare enough that the sync it forces doesn't matter.
+        if (batch_idx + 1) % 50 == 0:
+            pbar.set_postfix(loss=f'{loss.item():.4f}', refresh=False)
+    return running_loss.item() / len(loader), 100. * correct.item() / total
+
+
+def validate(model, loader, criterion):
+    model.eval()
+    val_loss = torch.zeros((), device=device)
+    correct = torch.zeros((), device=device, dtype=torch.long)
+    total = 0
+    with torch.inference_mode():
+        for images, labels in loader:
+            images = images.to(device, non_blocking=True,
+                               memory_format=torch.channels_last)
+            labels = labels.to(device, non_blocking=True)
+            images = _GPU_PREPROCESS(images)
+            with torch.autocast(device_type=device.type, dtype=_AMP_DTYPE):
+                outputs = model(images)
+                val_loss += criterion(outputs, labels)
+            correct += outputs.argmax(dim=1).eq(labels).sum()
+            total += labels.size(0)
+    return val_loss.item() / len(loader), 100. * correct.item() / total
+
+
+def main():
+    train_loader, val_loader, class_names = create_dataloaders()
+    model = create_model(len(class_names))
+    criterion = nn.CrossEntropyLoss()
+    # SGD over just the trainable head: momentum needs one state tensor
+    # where Adam kept two, and the filter keeps frozen backbone weights
+    # out of the optimizer entirely.
+    optimizer = optim.SGD(
+        (p for p in model.parameters() if p.requires_grad),
+        lr=LEARNING_RATE, momentum=0.9, weight_decay=WEIGHT_DECAY)
+    # No-op on CPU (enabled=False): bf16 needs no loss scaling.
+    scaler = torch.amp.GradScaler(device.type,
+                                  enabled=device.type == 'cuda')
+
+    best_val_loss = float('inf')
+    for epoch in range(NUM_EPOCHS):
+        print(f'Epoch {epoch + 1}/{NUM_EPOCHS}')
+        train_loss, train_acc = train_epoch(model, train_loader, criterion,
+                                            optimizer, scaler, epoch)
+        val_loss, val_acc = validate(model, val_loader, criterion)
+        print(f'  train loss {train_loss:.4f} acc {train_acc:.2f}% | '
+              f'val loss {val_loss:.4f} acc {val_acc:.2f}%')
+        if val_loss < best_val_loss:
+            best_val_loss = val_loss
+            os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+            # Raw state_dict, the format the API loads directly via
+            # model.load_state_dict(torch.load(MODEL_PATH)). Class order
+            # is ImageFolder's sorted directory names and must match the
+            # API's CLASS_NAMES; print it so a retrain that adds or
+            # renames a class is caught at deploy time.
+            torch.save(model.state_dict(), MODEL_PATH)
+            print(f'  saved new best model (classes: {class_names})')
+
+
+if __name__ == '__main__':
+    main()